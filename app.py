@@ -1,8 +1,23 @@
 
+import os
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+import data_store
+import filter_index
+import cube
+import scatter
+import table_view
+import profiler
+import correlation
+import charts
+import geo_index
+import query
+import sketch
+import tracing
+
 
 st.set_page_config(
     page_title="Airbnb Data Analysis",
@@ -14,15 +29,79 @@ st.set_page_config(
 st.title("🏠 Airbnb Analysis")
 st.markdown("---")
 
+# -----------------------
+# Instrumentation
+# -----------------------
+# Spans are only recorded when asked for: on every rerun when AIRBNB_TRACE_DIR
+# is set (one Chrome trace file per rerun), or from the Debug panel that
+# ?debug=1 adds to the sidebar. Otherwise tracing.span() hands back a no-op.
+trace_dir = os.environ.get(tracing.TRACE_DIR_ENV)
+debug = 'debug' in st.query_params
+if trace_dir or (debug and st.session_state.get('trace_spans', True)):
+    tracing.start(memory=st.session_state.get('trace_memory', True))
+
+
+
+
+# One read-only, memory-mapped column store shared by every session instead
+# of a per-session copy; sessions only derive filtered views from it, and
+# pages read just the columns they need, so the data does not have to fit in RAM.
+# Keyed on the CSV's mtime so a regenerated CSV replaces the shared handle.
+@st.cache_resource(max_entries=1)
+def load_data(source_mtime_ns):
+    store = query.ColumnStore(data_store.ensure_cache('Airbnb_Cleaned.csv'))
+    return query.View(store)
+
+
+@st.cache_resource(max_entries=1)
+def load_filter_index(source_mtime_ns):
+    return filter_index.FilterIndex(load_data(source_mtime_ns))
 
 
+# Pre-aggregated sums / counts behind the Analysis Questions charts
+@st.cache_resource(max_entries=1)
+def load_cube(source_mtime_ns):
+    return cube.Cube(load_data(source_mtime_ns))
 
-@st.cache_data
-def load_data():
-    df = pd.read_csv('Airbnb_Cleaned.csv')
-    return df
 
-df = load_data()
+# Built Analysis Questions charts, shared by every session
+@st.cache_resource
+def load_chart_cache():
+    return charts.ChartCache(max_entries=128)
+
+
+# Per-filter-cell moments behind the correlation heatmap
+@st.cache_resource(max_entries=1)
+def load_correlation_stats(source_mtime_ns):
+    return correlation.CorrelationStats(load_data(source_mtime_ns))
+
+
+@st.cache_resource(max_entries=1)
+def load_sort_index(source_mtime_ns):
+    return table_view.SortIndex(load_data(source_mtime_ns))
+
+
+# Quadtree over the listings' coordinates with per-zoom cell aggregates
+@st.cache_resource(max_entries=1)
+def load_geo_index(source_mtime_ns):
+    return geo_index.GeoIndex(load_data(source_mtime_ns))
+
+
+# Per-cell t-digests behind median / percentile charts and metrics
+@st.cache_resource(max_entries=1)
+def load_sketches(source_mtime_ns):
+    return sketch.CellSketches(load_data(source_mtime_ns))
+
+with tracing.span('load', 'load') as load_span:
+    source_mtime_ns = os.stat('Airbnb_Cleaned.csv').st_mtime_ns
+    df = load_data(source_mtime_ns)
+    filter_idx = load_filter_index(source_mtime_ns)
+    olap = load_cube(source_mtime_ns)
+    sort_index = load_sort_index(source_mtime_ns)
+    corr_stats = load_correlation_stats(source_mtime_ns)
+    sketches = load_sketches(source_mtime_ns)
+    chart_cache = load_chart_cache()
+    load_span.set(rows=len(df))
 
 # -----------------------
 # Sidebar navigation
@@ -34,8 +113,8 @@ page = st.sidebar.radio(
         "Data Overview",
         "Data Visualization Playground",
         "Correlation Heatmap",
-        'Analysis Questions'
-        
+        'Analysis Questions',
+        "Listings Map"
     ]
 )
 
@@ -46,7 +125,7 @@ st.sidebar.markdown("---")
 st.sidebar.title("Filters")
 
 # Room Type Filter
-room_types = df['room_type'].unique().tolist()
+room_types = filter_idx.options['room_type']
 selected_room_types = st.sidebar.multiselect(
     "Select Room Types",
     room_types,
@@ -54,17 +133,109 @@ selected_room_types = st.sidebar.multiselect(
 )
 
 # Neighbourhood Filter
-neighbourhoods = df['neighbourhood_group'].unique().tolist()
+neighbourhoods = filter_idx.options['neighbourhood_group']
 selected_neighbourhoods = st.sidebar.multiselect(
     "Select Neighbourhoods",
     neighbourhoods,
     default=neighbourhoods
 )
 
-df_filtered = df[
-    (df['room_type'].isin(selected_room_types)) &
-    (df['neighbourhood_group'].isin(selected_neighbourhoods))
-]
+selections = {
+    'room_type': selected_room_types,
+    'neighbourhood_group': selected_neighbourhoods,
+}
+
+# Hashable stand-in for the selection, used to key per-filter caches
+selection_key = tuple((col, tuple(sorted(map(str, values)))) for col, values in selections.items())
+
+
+# Bitmap lookup instead of isin() scans. The row positions of a selection are
+# one read-only array shared by every session with that selection, not a
+# per-session copy the size of the matching rows.
+@st.cache_resource(max_entries=32)
+def selected_rows(source_mtime_ns, selection_key, _selections):
+    rows = filter_idx.select(_selections)
+    if rows is not None:
+        rows.flags.writeable = False
+    return rows
+
+
+# No copy when the selection covers everything
+with tracing.span('filter', 'filter') as filter_span:
+    rows = selected_rows(source_mtime_ns, selection_key, selections)
+    df_filtered = filter_index.apply_rows(df, rows)
+    filter_span.set(rows=len(df_filtered))
+
+# -----------------------
+# Chart Settings
+# -----------------------
+st.sidebar.markdown("---")
+st.sidebar.title("Chart Settings")
+scatter_limit = st.sidebar.number_input(
+    "Max scatter points",
+    min_value=1000,
+    value=scatter.POINT_LIMIT,
+    step=1000
+)
+scatter_mode = st.sidebar.radio(
+    "Larger scatters show",
+    ["Density", "Sample"],
+    horizontal=True
+)
+
+
+# Binning / sampling runs once per (selection, columns, settings)
+@st.cache_data(max_entries=64, show_spinner=False)
+def reduce_scatter(source_mtime_ns, selection_key, x_col, y_col, max_points, mode, _frame):
+    with tracing.span('scatter.reduce', 'aggregate', rows=len(_frame)):
+        return scatter.reduce(_frame, x_col, y_col, max_points, mode)
+
+
+def scatter_figure(x_col, y_col, title=None, labels=None):
+    reduced = reduce_scatter(source_mtime_ns, selection_key, x_col, y_col, scatter_limit, scatter_mode, df_filtered)
+    with tracing.span('scatter.figure', 'figure', rows=len(df_filtered) if reduced is None else len(reduced['x'])):
+        return scatter.figure(df_filtered, x_col, y_col, reduced, title=title, labels=labels)
+
+
+# Shared read-only, like the row positions: cache_data would unpickle a copy per session
+@st.cache_resource(max_entries=32, show_spinner=False)
+def column_profile(source_mtime_ns, selection_key, _frame):
+    return query.profile(_frame)
+
+
+# Count, mean and percentiles of one measure per group, from the quantile sketches
+@st.cache_data(max_entries=32, show_spinner=False)
+def distribution_table(source_mtime_ns, selection_key, by, measure):
+    with tracing.span('sketch.rollup', 'aggregate', by=by, measure=measure):
+        qs = list(sketch.QUANTILE_STATS.values())
+        if by:
+            table = sketches.rollup(list(by), measure, qs, selections)
+        else:
+            table = sketches.total(measure, qs, selections).to_frame().T
+    return table.rename(columns={q: stat for stat, q in sketch.QUANTILE_STATS.items()}).round(2)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def spearman_matrix(source_mtime_ns, selection_key, _rows):
+    with tracing.span('spearman', 'aggregate', rows=len(df) if _rows is None else len(_rows)):
+        return corr_stats.spearman(df, sort_index, _rows)
+
+
+# Sorted row order of the filtered view, shared across sessions with the same selection
+@st.cache_resource(max_entries=32)
+def table_order(source_mtime_ns, selection_key, sort_col, ascending, _rows):
+    return sort_index.ordered_rows(sort_col, ascending, _rows)
+
+
+# Serialising a figure or table for the browser is timed as its own span
+def show_chart(fig):
+    with tracing.span('st.plotly_chart', 'render'):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def show_table(frame):
+    with tracing.span('st.dataframe', 'render', rows=len(frame)):
+        st.dataframe(frame, use_container_width=True)
 
     
 
@@ -81,34 +252,71 @@ if page == "Data Overview":
 
 
     # Displaying basic statistics
-    col1, col2, col3, col4 = st.columns(4)
+    # Price percentiles merge the sketches of the selected cells instead of sorting the rows
+    price_stats = distribution_table(source_mtime_ns, selection_key, (), 'price')
+    price_pct = price_stats.iloc[0] if len(price_stats) else pd.Series(dtype='float64')
+    col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
         st.metric("Total Listings", f"{len(df_filtered):,}")
     with col2:
-        st.metric("Avg Price", f"${df_filtered['price'].mean():.2f}")
+        st.metric("Avg Price", f"${query.mean(df_filtered, 'price'):.2f}")
     with col3:
-        st.metric("Neighborhoods", df_filtered['neighbourhood_group'].nunique())
+        st.metric("Median Price", f"${price_pct.get('median', float('nan')):.2f}",
+                  help=f"90th percentile: ${price_pct.get('p90', float('nan')):.2f}, 99th percentile: ${price_pct.get('p99', float('nan')):.2f}")
     with col4:
-        st.metric("Room Types", df_filtered['room_type'].nunique())
+        st.metric("Neighborhoods", query.nunique(df_filtered, 'neighbourhood_group'))
+    with col5:
+        st.metric("Room Types", query.nunique(df_filtered, 'room_type'))
 
     st.markdown("---")
 
 
     # Displaying the dataset
     st.header("👀 Airbnb Data")
-    st.dataframe(df_filtered, use_container_width=True)
+    # Only the visible page is sent to the browser; sorting uses precomputed permutations
+    table_cols = st.multiselect("Columns", df.columns.tolist(), default=df.columns.tolist())
+    tcol1, tcol2, tcol3, tcol4 = st.columns(4)
+    with tcol1:
+        sort_col = st.selectbox("Sort by", ["(none)"] + table_cols)
+    with tcol2:
+        ascending = st.radio("Order", ["Ascending", "Descending"], horizontal=True) == "Ascending"
+    with tcol3:
+        page_size = st.selectbox("Rows per page", table_view.PAGE_SIZES, index=2)
+    total_rows = len(df_filtered)
+    n_pages = max(1, -(-total_rows // page_size))
+    with tcol4:
+        page_no = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1)
+
+    if sort_col == "(none)":
+        positions = rows
+    else:
+        positions = table_order(source_mtime_ns, selection_key, sort_col, ascending, rows)
+    start, end = table_view.page_bounds(total_rows, page_no, page_size)
+    show_table(table_view.page_frame(df, positions, start, end, table_cols))
+    st.caption(f"Rows {start + 1 if end else 0:,}–{end:,} of {total_rows:,}")
     
 
     # Key Insights
     st.header("🔑 Key Insights")
+    price_min, price_max = query.value_range(df_filtered, 'price')
     insights = f"""
-    - **Average Price:** ${df_filtered['price'].mean():.2f} per night
-    - **Price Range:** ${df_filtered['price'].min():.0f} - ${df_filtered['price'].max():.0f}
-    - **Most Common Room Type:** {df_filtered['room_type'].mode()[0] if len(df_filtered) > 0 else 'N/A'}
-    - **Most Popular Neighborhood:** {df_filtered['neighbourhood_group'].mode()[0] if len(df_filtered) > 0 else 'N/A'}
-    - **Average Reviews per Month:** {df_filtered['reviews_per_month'].mean():.2f}
+    - **Average Price:** ${query.mean(df_filtered, 'price'):.2f} per night
+    - **Median Price:** ${price_pct.get('median', float('nan')):.2f} (90th percentile ${price_pct.get('p90', float('nan')):.2f}, 99th ${price_pct.get('p99', float('nan')):.2f})
+    - **Price Range:** ${price_min:.0f} - ${price_max:.0f}
+    - **Most Common Room Type:** {query.mode(df_filtered, 'room_type') if len(df_filtered) > 0 else 'N/A'}
+    - **Most Popular Neighborhood:** {query.mode(df_filtered, 'neighbourhood_group') if len(df_filtered) > 0 else 'N/A'}
+    - **Average Reviews per Month:** {query.mean(df_filtered, 'reviews_per_month'):.2f}
     """
     st.info(insights)
+
+    # Skewed measures are better described by percentiles than by their mean
+    st.subheader("📈 Distributions")
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        dist_measure = st.selectbox("Measure", sketches.measures)
+    with dcol2:
+        dist_by = st.selectbox("Group by", ["neighbourhood_group", "room_type"])
+    show_table(distribution_table(source_mtime_ns, selection_key, (dist_by,), dist_measure))
     
     st.markdown("---")
     
@@ -148,26 +356,34 @@ if page == "Data Overview":
     col_names = df_filtered.columns.tolist()
 
     st.subheader("📋 Column Details")
+    # Every column's stats come from one batched profiling pass, cached per selection
+    profile = column_profile(source_mtime_ns, selection_key, df_filtered)
     for col in col_names:
         with st.expander(f"**{col}**"):
             desc = column_descriptions.get(col, "No description available")
-            dtype = str(df_filtered[col].dtype)
-            non_null = df_filtered[col].notna().sum()
-            null_count = df_filtered[col].isna().sum()
+            p = profile[col]
             
             st.write(f"**Description:** {desc}")
-            st.write(f"**Data Type:** `{dtype}`")
-            st.write(f"**Non-null Count:** {non_null:,}")
-            st.write(f"**Null Count:** {null_count}")
+            st.write(f"**Data Type:** `{p['dtype']}`")
+            st.write(f"**Non-null Count:** {p['count']:,}")
+            st.write(f"**Null Count:** {p['null']}")
             
-            if dtype in ['int64', 'float64']:
-                st.write(f"**Min:** {df_filtered[col].min()}")
-                st.write(f"**Max:** {df_filtered[col].max()}")
-                st.write(f"**Mean:** {df_filtered[col].mean():.2f}")
+            if p['kind'] == 'numeric':
+                st.write(f"**Min:** {p['min']:g}")
+                st.write(f"**Max:** {p['max']:g}")
+                st.write(f"**Mean:** {profiler.mean(p):.2f}")
+                st.write("**Quantiles:** " + ", ".join(f"p{q * 100:g}: {v:g}" for q, v in p['quantiles'].items()))
+                hist = pd.DataFrame({'count': p['hist']}, index=[f"{edge:g}" for edge in p['edges'][:-1]])
+                st.bar_chart(hist, height=150)
+            elif p['kind'] == 'datetime':
+                st.write(f"**Min:** {p['min']}")
+                st.write(f"**Max:** {p['max']}")
             else:
-                st.write(f"**Unique Values:** {df_filtered[col].nunique()}")
-                if df_filtered[col].nunique() <= 10:
-                    st.write(f"**Values:** {', '.join(df_filtered[col].unique().astype(str))}")
+                st.write(f"**Unique Values:** {profiler.nunique(p)}")
+                if profiler.nunique(p) <= 10:
+                    st.write(f"**Values:** {', '.join(map(str, p['counts']))}")
+                else:
+                    st.write("**Top Values:** " + ", ".join(f"{value} ({n:,})" for value, n in profiler.top_values(p)))
 
     st.markdown("---")
 
@@ -185,7 +401,7 @@ if page == "Data Visualization Playground":
     )
 
     # Separate numeric and categorical columns
-    numeric_cols = df_filtered.select_dtypes(include=["int64", "float64"]).columns.tolist().copy()
+    numeric_cols = df_filtered.select_dtypes(include="number").columns.tolist().copy()
     if 'id' in numeric_cols:
         numeric_cols.remove('id')
     categorical_cols = df_filtered.select_dtypes(include=["object", "category"]).columns.tolist()
@@ -207,25 +423,27 @@ if page == "Data Visualization Playground":
             )
 
             if col in numeric_cols:
-                fig = px.scatter(
-                    df_filtered,
-                    y=col,
+                fig = scatter_figure(
+                    None,
+                    col,
                     title=f"Univariate Scatter Plot: {col}"
                 )
             if col in categorical_cols:
-                counts = df_filtered[col].value_counts().reset_index()
+                counts = query.value_counts(df_filtered, col).reset_index()
                 counts.columns = [col, "count"]  
+                counts = data_store.plain(counts[counts["count"] > 0])
 
-                fig = px.bar(
-                    counts,
-                    x=col,
-                    y="count",
-                    title=f"Univariate Bar Plot: {col}"
-                    
-                )
+                with tracing.span('px.bar', 'figure', rows=len(counts)):
+                    fig = px.bar(
+                        counts,
+                        x=col,
+                        y="count",
+                        title=f"Univariate Bar Plot: {col}"
+                        
+                    )
 
 
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig)
 
         else:  # Bivariate
             x_col = st.selectbox(
@@ -239,46 +457,50 @@ if page == "Data Visualization Playground":
 
             # Numeric vs Numeric → scatter
             if x_col in numeric_cols and y_col in numeric_cols:
-                fig = px.scatter(
-                    df_filtered,
-                    x=x_col,
-                    y=y_col,
+                fig = scatter_figure(
+                    x_col,
+                    y_col,
                     title=f"{y_col} vs {x_col}"
                 )
 
             # Categorical vs Numeric → bar
             elif x_col in categorical_cols and y_col in numeric_cols:
-                grouped = df_filtered.groupby(x_col)[y_col].mean().reset_index()
-                fig = px.bar(
-                    grouped,
-                    x=x_col,
-                    y=y_col,
-                    title=f"Average {y_col} by {x_col}",
-                    text_auto='.3s'
-                )
+                grouped = data_store.plain(query.groupby_mean(df_filtered, x_col, y_col))
+                with tracing.span('px.bar', 'figure', rows=len(grouped)):
+                    fig = px.bar(
+                        grouped,
+                        x=x_col,
+                        y=y_col,
+                        title=f"Average {y_col} by {x_col}",
+                        text_auto='.3s'
+                    )
 
             elif x_col in numeric_cols and y_col in categorical_cols:
-                grouped = df_filtered.groupby(y_col)[x_col].mean().reset_index()
-                fig = px.bar(
-                    grouped,
-                    x=y_col,
-                    y=x_col,
-                    title=f"Average {x_col} by {y_col}",
-                    text_auto='.3s'
-                )
+                grouped = data_store.plain(query.groupby_mean(df_filtered, y_col, x_col))
+                with tracing.span('px.bar', 'figure', rows=len(grouped)):
+                    fig = px.bar(
+                        grouped,
+                        x=y_col,
+                        y=x_col,
+                        title=f"Average {x_col} by {y_col}",
+                        text_auto='.3s'
+                    )
 
 
             # Categorical vs Categorical → grouped bar
             elif x_col in categorical_cols and y_col in categorical_cols:
-                fig = px.histogram(
-                    df_filtered,
-                    x=x_col,
-                    color=y_col,
-                    barmode="group",
-                    title=f"{x_col} vs {y_col}"
-                )
-
-            st.plotly_chart(fig, use_container_width=True)
+                source, counts_col = query.histogram_source(df_filtered, [x_col, y_col])
+                with tracing.span('px.histogram', 'figure', rows=len(source)):
+                    fig = px.histogram(
+                        data_store.plain(source),
+                        x=x_col,
+                        y=counts_col,
+                        color=y_col,
+                        barmode="group",
+                        title=f"{x_col} vs {y_col}"
+                    )
+
+            show_chart(fig)
             
             
             
@@ -298,17 +520,23 @@ elif page == "Correlation Heatmap":
 - **0** indicates no correlation (the variables do not have a linear relationship).
     """)
     
-    corr= df_filtered.corr(numeric_only=True).round(2).drop(['id'], axis=1).drop(['id'], axis=0)
-
-    fig = px.imshow(
-        corr,
-        text_auto=True,
-        color_continuous_scale="RdBu",
-        title="Correlation Heatmap",
-        width=800, height=800
-    )
+    method = st.radio("Method", ["Pearson", "Spearman"], horizontal=True)
+    if method == "Pearson":
+        with tracing.span('pearson', 'aggregate'):
+            corr = corr_stats.pearson(selections).round(2)
+    else:
+        corr = spearman_matrix(source_mtime_ns, selection_key, rows).round(2)
+
+    with tracing.span('px.imshow', 'figure'):
+        fig = px.imshow(
+            corr,
+            text_auto=True,
+            color_continuous_scale="RdBu",
+            title="Correlation Heatmap",
+            width=800, height=800
+        )
 
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(fig)
 
 # ==================================================
 # PAGE 4: Analysis Questions
@@ -317,96 +545,152 @@ elif page == "Correlation Heatmap":
 elif page == "Analysis Questions":
     st.subheader("❓ Analysis Questions & Charts")
 
-    # Q1
-    st.markdown("#### 1) What is the relation between listing price and factors like : service fee, room type, location, reviews, host size, etc..?")
-    st.write("""- The strong linear relationship between price and service fee indicates that service fee is mostly caclulated as a percentage from price. 
-                While the points surrounding the straight line suggests some hosts use other methods like a fixed figure to set the service fee amount.""") 
-    fig_price_service = px.scatter(df_filtered, x='price', y='service_fee', labels={'price': 'Price ($)', 'service_fee': 'Service Fee ($)'}, title='Price vs Service Fee')
-    st.plotly_chart(fig_price_service, use_container_width=True)
-    st.write("""- Airbnb market is dominated by small hosts.""")
-    st.write("""- A minority of hosts control many listings.""") 
-    st.write("""- Professional hosts exist across all price levels.""")
-    st.write("""- Price is independent of host size.""")
-    fig_price_host = px.scatter(df_filtered, x='price', y='calculated_host_listings_count', labels={'calculated_host_listings_count': 'Listings per Host'}, title='Price vs Host Listings Count')
-    st.plotly_chart(fig_price_host, use_container_width=True)
-    
-    # Q2
-    st.markdown("#### 2) What is the distribution of room types by neighbourhood?")
-    st.write("""- Manhattan and Brooklyn dominate the market, with the highest number of listings, especially entire homes and private rooms.""")
-    st.write("""- Queens has moderate supply, while Staten Island and the Bronx contribute only a small share of total listings across all room types.""")    
-    fig_room_neigh = px.histogram(df_filtered, x='neighbourhood_group', color='room_type', title='Listings by Neighbourhood Group and Room Type', labels={'neighbourhood_group': 'Neighbourhood', 'room_type': 'Room Type'})
-    st.plotly_chart(fig_room_neigh, use_container_width=True)
-
-    # Q3
-    st.markdown("#### 3) What is the average price per neighbhourhood?")
-    st.write("""- The average prices are nearly identical across all neighbourhood groups, indicating minimal price variation by neighbourhood.""")
-    neighborhood_price = df_filtered.groupby('neighbourhood_group')['price'].mean().round(2).sort_values(ascending=False).reset_index()
-    fig_nb = px.bar(neighborhood_price, x='neighbourhood_group', y='price', title='Average Price by Neighbourhood Group', text_auto='.3s', labels={'price': 'Price', 'neighbourhood_group': 'Neighbourhood'}, color='neighbourhood_group')
-    st.plotly_chart(fig_nb, use_container_width=True)
-
-    # Q4
-    st.markdown("#### 4) What is the average price per room type?")
-    st.write("""- Average prices are relatively similar across room types, with hotel rooms slightly higher, indicating limited price differentiation by accommodation category.""")
-    room_price = df_filtered.groupby('room_type')['price'].mean().round(2).sort_values(ascending=False).reset_index()
-    fig_room = px.bar(room_price, x='room_type', y='price', title='Average Price by Room Type', text_auto='.3s', labels={'price': 'Price', 'room_type': 'Room Type'}, color='room_type')
-    st.plotly_chart(fig_room, use_container_width=True)
-
-    # Q5
-    st.markdown("#### 5) What is the average minimum nights for each type of listing (aka room type) in each neighbourhood?")
-    st.write("""- Entire homes/apartments generally require longer minimum stays, especially in Manhattan, indicating a focus on longer bookings.""")
-    st.write("""- Hotel and shared rooms tend to have shorter minimum night requirements, making them more flexible for short-term stays.""")
-    room_nights = df_filtered.groupby(['room_type','neighbourhood_group'])['minimum_nights'].mean().round(2).reset_index()
-    fig_nights = px.bar(room_nights, x='neighbourhood_group', y='minimum_nights', color='room_type', barmode='group', title='Average Minimum Nights by Neighbourhood Group & Room Type', labels={'minimum_nights': 'Minimum Nights', 'neighbourhood_group': 'Neighbourhood', 'room_type' : 'Room Type'})
-    st.plotly_chart(fig_nights, use_container_width=True)
-
-    # Q6
-    st.markdown("#### 6) What is the average rating for each type of listing (aka room type) in each neighbourhood?")
-    st.write("""- Average ratings are fairly consistent across all neighbourhoods and room types, generally ranging between 3.2 and 3.9.""")
-    st.write("""- Hotel rooms and private rooms tend to receive slightly higher ratings compared to entire homes and shared rooms in most neighbourhoods.""")
-    if 'review_rate_number' in df_filtered.columns:
-        room_rating = df_filtered.groupby(['room_type','neighbourhood_group'])['review_rate_number'].mean().round(2).reset_index()
-        fig_rating = px.bar(room_rating, x='neighbourhood_group', y='review_rate_number', color='room_type', barmode='group', title='Average Review Rate Number by Neighbourhood Group & Room Type', labels={'review_rate_number': 'Rating Number', 'neighbourhood_group': 'Neighbourhood', 'room_type' : 'Room Type'})
-        st.plotly_chart(fig_rating, use_container_width=True)
-
-    # Q7
-    st.markdown("#### 7) What is the trend of Price by Last Review Year and Neighbourhood Group?")
-    st.write("""- After some early fluctuations, average prices across all neighbourhoods remain relatively stable from 2017 onward.""")
-    if 'year' in df_filtered.columns:
-        price_trend = df_filtered[df_filtered['year'] != 2000].groupby(['year','neighbourhood_group'])['price'].mean().reset_index().round(2)
-        fig_trend = px.line(price_trend, x='year', y='price', color='neighbourhood_group', markers=True, title='Trend of Price by Last Review Year and Neighbourhood')
-        st.plotly_chart(fig_trend, use_container_width=True)
-
-    # Q8
-    st.markdown("#### 8) What is the average price per Neighbhorhood per Room Type?")
-    st.write("""- Average prices are fairly consistent across neighbourhoods for most room types, though hotel rooms show greater variation compared to other accommodation categories.""")  
-    plot_price = df_filtered.groupby(['neighbourhood_group','room_type'])['price'].mean().round(2).reset_index()
-    fig_price_by_room = px.bar(plot_price, x='neighbourhood_group', y='price', color='room_type', barmode='group', title='Average Price per Neighborhood per Room Type', labels={'neighbourhood_group': 'Neighborhood Group', 'price': 'Price', 'room_type': 'Room Type'})
-    st.plotly_chart(fig_price_by_room, use_container_width=True)
-
-    # Q9
-    st.markdown("#### 9) What is the average Number of Reviews per Neighbhorhood per Room Type?")
-    st.write("""- Manhattan shows the highest average number of reviews, particularly for hotel rooms, indicating stronger guest activity and demand.""")
-    st.write("""- Staten Island and the Bronx have noticeably fewer reviews across most room types, suggesting lower overall booking volume.""")
-    plot_review = df_filtered.groupby(['neighbourhood_group','room_type'])['number_of_reviews'].mean().round(2).reset_index()
-    fig_reviews_by_room = px.bar(plot_review, x='neighbourhood_group', y='number_of_reviews', color='room_type', barmode='group', title='Average number of reviews per Neighborhood per Room Type', labels={'neighbourhood_group': 'Neighborhood Group', 'number_of_reviews': 'number of reviews', 'room_type': 'Room Type'})
-    st.plotly_chart(fig_reviews_by_room, use_container_width=True)
-
-    # Q10
-    st.markdown("#### 10) What is the average price by cancellation policy and instant bookable status?")
-    st.write("""- Listings with strict cancellation policies tend to have slightly higher average prices compared to flexible and moderate policies.""")
-    st.write("""- Instant bookable status shows minimal impact on price, as average prices remain relatively similar across True and False categories.""")
-    if 'cancellation_policy' in df_filtered.columns and 'instant_bookable' in df_filtered.columns:
-        agg = df_filtered[df_filtered['instant_bookable'].notna() & df_filtered['cancellation_policy'].notna()].groupby(['cancellation_policy','instant_bookable'])['price'].mean().reset_index()
-        fig_policy = px.bar(agg, x='cancellation_policy', y='price', color='instant_bookable', barmode='group', title='Average Price by Cancellation Policy & Instant Bookable', text_auto='.3s', labels={'price': 'Price', 'cancellation_policy': 'Cancellation Policy', 'instant_bookable': 'Instant Bookable'})
-        st.plotly_chart(fig_policy, use_container_width=True)
-
-    # Q11
-    st.markdown("#### 11) Which locations have the strongest demand?")
-    st.write("""- Queens shows the highest average reviews per month, indicating relatively stronger booking activity.""")
-    st.write("""- Brooklyn and Manhattan have slightly lower averages, suggesting demand is more evenly distributed rather than heavily concentrated.""")
-    location_demand = df_filtered.groupby('neighbourhood_group').agg({'reviews_per_month':'mean','number_of_reviews':'mean','availability_365':'mean','price':'mean','id':'count'}).rename(columns={'id':'listing_count'})
-    location_demand = location_demand.round(2).reset_index()
-    fig_demand = px.bar(location_demand, x='neighbourhood_group', y='reviews_per_month', title='Average Reviews per Month by Neighbourhood', labels={'reviews_per_month': 'Avg Reviews per Month', 'neighbourhood_group': 'Neighbourhood'}, color='neighbourhood_group')
-    st.plotly_chart(fig_demand, use_container_width=True)
+    # Only the chosen question is built; built questions are memoised per
+    # (question, selection, data version, settings it uses) across sessions
+    question_ids = list(charts.QUESTIONS)
+    shown = st.selectbox(
+        "Question",
+        question_ids + ["all"],
+        format_func=lambda qid: "All questions" if qid == "all" else charts.QUESTIONS[qid]['heading']
+    )
+
+    # Percentiles of skewed measures come from the quantile sketches
+    stat = st.radio("Statistic", list(charts.STAT_LABELS), horizontal=True,
+                    format_func=lambda s: charts.STAT_LABELS[s])
+
+    chart_ctx = {
+        'df': df_filtered,
+        'cube': olap,
+        'selections': selections,
+        'scatter_figure': scatter_figure,
+        'sketches': sketches,
+        'stat': stat,
+    }
+    chart_settings = {'scatter_limit': scatter_limit, 'scatter_mode': scatter_mode, 'stat': stat}
+    for qid in (question_ids if shown == "all" else [shown]):
+        q = charts.QUESTIONS[qid]
+        st.markdown(f"#### {q['heading']}")
+        if not all(col in df_filtered.columns for col in q['requires']):
+            continue
+        key = charts.cache_key(qid, selection_key, source_mtime_ns, chart_settings)
+        for item in chart_cache.get(key, lambda: charts.build_question(qid, chart_ctx)):
+            if isinstance(item, str):
+                st.write(item)
+            else:
+                show_chart(item)
+
+    stats = chart_cache.stats()
+    st.caption(
+        f"Chart cache: {stats['hits']:,} hits, {stats['misses']:,} misses, "
+        f"{stats['evictions']:,} evictions, {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB"
+    )
 
     st.markdown("---")
+
+
+# ==================================================
+# PAGE 5: Listings Map
+# ==================================================
+
+elif page == "Listings Map":
+    st.subheader("🗺️ Listings Map")
+    st.write(
+        "Listings are drawn as grid cells sized by the number of listings in them. "
+        f"From zoom {geo_index.POINT_ZOOM} on, the individual listings are shown instead."
+    )
+
+    # The map places listings by latitude / longitude and labels them by name
+    missing_cols = [col for col in ['name'] + geo_index.LOCATION_COLUMNS if col not in df.columns]
+    if missing_cols:
+        st.warning(f"The map needs columns this dataset does not have: {', '.join(missing_cols)}.")
+    else:
+        geo = load_geo_index(source_mtime_ns)
+        # Only the measures this dataset has can colour the map or show on hover
+        metrics = {"Listings": 'listings', "Mean price": 'price', "Mean reviews per month": 'reviews_per_month'}
+        metrics = {label: m for label, m in metrics.items() if m == 'listings' or m in geo.measures}
+        hover_formats = {m: fmt for m, fmt in [('price', ':.0f'), ('reviews_per_month', ':.2f')] if m in geo.measures}
+        room_hover = {'room_type': True} if 'room_type' in df.columns else {}
+
+        # Frames the filtered listings, or one borough of them
+        centre_on = st.selectbox("Centre on", ["Filtered listings"] + [n for n in selected_neighbourhoods if not pd.isna(n)])
+        focus = selections if centre_on == "Filtered listings" else {**selections, 'neighbourhood_group': [centre_on]}
+        fit = geo.fit(focus)
+        if fit is None:
+            st.warning("No listings with coordinates match the current filters.")
+        else:
+            # Plotly charts don't report pans and zooms back to the app, so the view is set here
+            mcol1, mcol2, mcol3, mcol4 = st.columns(4)
+            with mcol1:
+                zoom = st.slider("Zoom", geo_index.MIN_ZOOM, geo_index.MAX_ZOOM, value=fit[2], key=f"map_zoom_{centre_on}")
+            with mcol2:
+                centre_lat = st.number_input("Centre latitude", value=round(fit[0], 4), step=0.01, format="%.4f", key=f"map_lat_{centre_on}")
+            with mcol3:
+                centre_lon = st.number_input("Centre longitude", value=round(fit[1], 4), step=0.01, format="%.4f", key=f"map_lon_{centre_on}")
+            with mcol4:
+                metric = st.selectbox("Colour by", list(metrics))
+
+            bounds = geo_index.viewport(centre_lat, centre_lon, zoom)
+            if zoom >= geo_index.POINT_ZOOM:
+                with tracing.span('geo.points', 'aggregate') as geo_span:
+                    positions, in_view = geo.points(bounds, zoom, selections, max_points=scatter_limit)
+                    points = data_store.plain(df.take(positions)[['name', 'latitude', 'longitude', *room_hover, *hover_formats]])
+                    geo_span.set(rows=len(points))
+                with tracing.span('px.scatter_mapbox', 'figure', rows=len(points)):
+                    fig = px.scatter_mapbox(
+                        points,
+                        lat='latitude',
+                        lon='longitude',
+                        color=None if metrics[metric] == 'listings' else metrics[metric],
+                        hover_name='name',
+                        hover_data={**room_hover, **hover_formats, 'latitude': False, 'longitude': False},
+                        labels={'price': 'Price', 'reviews_per_month': 'Reviews per Month', 'room_type': 'Room Type'},
+                    )
+                map_caption = f"{len(points):,} of {in_view:,} listings in view"
+            else:
+                with tracing.span('geo.cells', 'aggregate') as geo_span:
+                    cells = geo.cells(bounds, zoom, selections)
+                    geo_span.set(rows=len(cells))
+                with tracing.span('px.scatter_mapbox', 'figure', rows=len(cells)):
+                    fig = px.scatter_mapbox(
+                        cells,
+                        lat='latitude',
+                        lon='longitude',
+                        size='listings',
+                        color=metrics[metric],
+                        size_max=30,
+                        color_continuous_scale='Viridis',
+                        hover_data={'listings': ':,', **hover_formats, 'latitude': False, 'longitude': False},
+                        labels={'listings': 'Listings', 'price': 'Mean Price', 'reviews_per_month': 'Mean Reviews per Month'},
+                    )
+                map_caption = f"{len(cells):,} cells holding {cells['listings'].sum():,} listings in view"
+
+            fig.update_layout(
+                mapbox_style='open-street-map',
+                mapbox_center={'lat': centre_lat, 'lon': centre_lon},
+                mapbox_zoom=zoom,
+                height=geo_index.MAP_HEIGHT,
+                margin={'l': 0, 'r': 0, 't': 0, 'b': 0},
+            )
+            show_chart(fig)
+            st.caption(map_caption)
+
+    st.markdown("---")
+
+# -----------------------
+# Debug panel
+# -----------------------
+trace = tracing.finish()
+if trace is not None and trace_dir:
+    trace.dump(trace_dir)
+
+if debug:
+    with st.sidebar.expander("Debug", expanded=True):
+        st.checkbox("Record spans", value=True, key='trace_spans')
+        st.checkbox("Track memory (slower)", value=True, key='trace_memory')
+        if trace is None:
+            st.caption("Tick Record spans to time the next rerun.")
+        else:
+            total = sum(s.seconds for s in trace.spans if s.depth == 0)
+            st.caption(f"{len(trace.spans)} spans, {total * 1e3:,.0f} ms in top-level spans")
+            st.dataframe(pd.DataFrame(trace.summary()), hide_index=True, use_container_width=True)
+            st.download_button("Chrome trace", trace.to_json(), file_name='trace.json', mime='application/json')
@@ -0,0 +1,78 @@
+import argparse
+import filecmp
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cleaning
+
+
+CHUNK_SIZES = [100_000, 10_007, 997]
+
+
+def with_duplicates(raw_path, out_path, n_duplicates, seed=0):
+    # The raw CSV with two kinds of repeats appended at the end:
+    # - exact copies of random earlier rows, so most of them land in a
+    #   different chunk from their original;
+    # - pairs of rows with no reviews that differ only in a blank vs a 0
+    #   reviews per month, which cleaning makes identical. The first of each
+    #   pair comes in one block and the second in the next, so whether a pair
+    #   shares a chunk depends on the chunk size.
+    raw = pd.read_csv(raw_path, dtype=str, keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    n = min(n_duplicates, len(raw))
+    copies = raw.iloc[np.sort(rng.choice(len(raw), size=n, replace=False))]
+    blank = raw.iloc[np.sort(rng.choice(len(raw), size=n, replace=False))].copy()
+    blank['id'] = [str(10**12 + i) for i in range(n)]
+    blank['number of reviews'] = '0'
+    blank['reviews per month'] = ''
+    zero = blank.assign(**{'reviews per month': '0'})
+    pd.concat([raw, copies, blank, zero]).to_csv(out_path, index=False)
+    return len(raw) + 3 * n
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the raw CSV at several chunk sizes and check every output is identical.')
+    parser.add_argument('raw', nargs='?', default=os.path.join(ROOT, cleaning.RAW_CSV_PATH))
+    parser.add_argument('--chunksizes', type=int, nargs='+', default=CHUNK_SIZES,
+                        help='compared against the whole file as one chunk')
+    parser.add_argument('--duplicates', type=int, default=50, help='exact and near repeats to add at the end of the file')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-cleaning-')
+    try:
+        raw_path = os.path.join(tmp, 'raw.csv')
+        n_raw = with_duplicates(args.raw, raw_path, args.duplicates)
+        print(f"raw rows: {n_raw:,} ({args.duplicates:,} exact and {args.duplicates:,} near repeats at the end)")
+        print(f"{'chunksize':>10} {'rows out':>10} {'seconds':>8}  same as one chunk")
+
+        results = []
+        mismatches = 0
+        reference = None
+        for chunksize in [n_raw + 1] + args.chunksizes:
+            out_path = os.path.join(tmp, f'clean-{chunksize}.csv')
+            start = time.perf_counter()
+            rows_in, rows_out = cleaning.run(raw_path, out_path, chunksize, args.workers)
+            seconds = time.perf_counter() - start
+            same = reference is None or filecmp.cmp(reference, out_path, shallow=False)
+            reference = reference or out_path
+            mismatches += not same
+            print(f"{chunksize:>10,} {rows_out:>10,} {seconds:>8.2f}  {'yes' if same else 'NO'}")
+            results.append({'chunksize': chunksize, 'rows_out': rows_out, 'seconds': seconds, 'same': same})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({'raw_rows': n_raw, 'duplicates': args.duplicates, 'mismatches': mismatches, 'results': results}))
+    if mismatches:
+        print(f"{mismatches} chunk sizes gave a different cleaned CSV", file=sys.stderr)
+        sys.exit(1)
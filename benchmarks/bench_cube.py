@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cube
+import data_store
+
+
+STATS = ['mean', 'sum', 'count', 'std']
+
+# std comes from sums of squares, so it is compared a little more loosely
+RTOL = {'mean': 1e-9, 'sum': 1e-9, 'count': 0, 'std': 1e-6}
+
+
+def with_missing(df, dimensions, fraction, rng):
+    # Blanks a random fraction of every dimension, so cells with missing
+    # dimension values are always part of the check
+    df = df.copy()
+    for col in dimensions:
+        values = df[col].astype(object)
+        values[rng.random(len(df)) < fraction] = np.nan
+        df[col] = values
+    return df
+
+
+def random_case(rng, values, measures):
+    # A groupby over 1-3 dimensions of 1-3 measures under a random filter:
+    # some dimensions restricted to a random subset of their values (missing
+    # included), sometimes with some values of another dimension excluded
+    dimensions = list(values)
+    by = list(rng.choice(dimensions, size=rng.integers(1, min(3, len(dimensions)) + 1), replace=False))
+    picked = list(rng.choice(measures + ['n_rows'], size=rng.integers(1, 4), replace=False))
+    selections = {}
+    for col in rng.choice(dimensions, size=rng.integers(0, len(dimensions) + 1), replace=False):
+        options = values[col] + [np.nan]
+        keep = rng.random(len(options)) < 0.6
+        selections[col] = [v for v, k in zip(options, keep) if k]
+    exclude = None
+    if rng.random() < 0.3:
+        col = rng.choice(dimensions)
+        exclude = {col: [values[col][rng.integers(len(values[col]))]]} if values[col] else None
+    return by, picked, selections, exclude, STATS[rng.integers(len(STATS))]
+
+
+def matches(series, values):
+    # Rows whose value is one of values, a NaN in values matching missing
+    # rows. Written out here rather than taken from cube, so the check does
+    # not share the filter logic it is checking.
+    present = [v for v in values if not pd.isna(v)]
+    hit = series.isin(present).to_numpy()
+    if len(present) < len(values):
+        hit |= series.isna().to_numpy()
+    return hit
+
+
+def filter_mask(df, selections=None, exclude=None):
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in (selections or {}).items():
+        mask &= matches(df[col], values)
+    for col, values in (exclude or {}).items():
+        mask &= ~matches(df[col], values)
+    return mask
+
+
+def expected(df, by, measures, selections, exclude, stat):
+    mask = filter_mask(df, selections, exclude)
+    grouped = df[mask].groupby(by, sort=True)
+    out = grouped[[m for m in measures if m != 'n_rows']].agg(stat)
+    if 'n_rows' in measures:
+        out['n_rows'] = grouped.size()
+    return out[measures]
+
+
+def compare(got, want, stat):
+    # Same groups in the same order, and values equal up to float rounding
+    if not got.index.equals(want.index) or list(got.columns) != list(want.columns):
+        return False
+    for col in want.columns:
+        a = got[col].to_numpy(dtype='float64')
+        b = want[col].to_numpy(dtype='float64')
+        rtol = 0 if col == 'n_rows' else RTOL[stat]
+        scale = np.nanmax(np.abs(b)) if np.isfinite(b).any() else 1.0
+        if not np.allclose(a, b, rtol=rtol, atol=rtol * scale, equal_nan=True):
+            return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check Cube.rollup against pandas groupby over random filters, groupings and stats.')
+    parser.add_argument('csv', nargs='?', default=os.path.join(ROOT, data_store.CSV_PATH))
+    parser.add_argument('--cases', type=int, default=500)
+    parser.add_argument('--missing', type=float, default=0.02, help='fraction of each dimension blanked to NaN')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    df = data_store.plain(data_store.load_dataset(args.csv))
+    dimensions = [d for d in cube.DIMENSIONS if d in df.columns]
+    measures = [m for m in cube.MEASURES if m in df.columns]
+    df = with_missing(df, dimensions, args.missing, rng)
+
+    start = time.perf_counter()
+    olap = cube.Cube(df)
+    build_seconds = time.perf_counter() - start
+    values = {col: sorted(df[col].dropna().unique().tolist()) for col in dimensions}
+    print(f"rows: {len(df):,}   cells: {len(olap.cells):,}   build: {build_seconds:.2f}s   cases: {args.cases:,}")
+
+    failures = []
+    cube_seconds = pandas_seconds = 0.0
+    for i in range(args.cases):
+        by, picked, selections, exclude, stat = random_case(rng, values, measures)
+        start = time.perf_counter()
+        got = olap.rollup(by, picked, selections, exclude, stat=stat)
+        cube_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        want = expected(df, by, picked, selections, exclude, stat)
+        pandas_seconds += time.perf_counter() - start
+        if not compare(got, want, stat):
+            failures.append({'case': i, 'by': by, 'measures': picked, 'stat': stat,
+                             'selections': selections, 'exclude': exclude})
+            print(f"MISMATCH case {i}: {stat} of {picked} by {by}, selections={selections}, exclude={exclude}")
+
+    print(f"cube: {cube_seconds / args.cases * 1e3:.2f} ms per rollup   pandas: {pandas_seconds / args.cases * 1e3:.2f} ms per groupby")
+    print(json.dumps({'rows': len(df), 'cells': len(olap.cells), 'cases': args.cases, 'missing': args.missing,
+                      'build_seconds': build_seconds, 'cube_seconds': cube_seconds, 'pandas_seconds': pandas_seconds,
+                      'failures': len(failures)}, default=str))
+    if failures:
+        print(f"{len(failures)} rollups differ from pandas groupby", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_store
+
+
+# Each path runs in a fresh interpreter so the numbers reflect a cold start
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd
+import data_store
+
+
+def current_rss_kb():
+    # VmRSS is Linux-only; elsewhere fall back to the peak, which is what we can get
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+rss_before = current_rss_kb()
+start = time.perf_counter()
+if {mode!r} == 'csv':
+    df = pd.read_csv({csv!r})
+else:
+    df = data_store.load_columnar({cache!r})
+elapsed = time.perf_counter() - start
+rss_after = current_rss_kb()
+
+print(json.dumps({{
+    'load_seconds': elapsed,
+    'rss_mb': rss_after / 1024,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'rss_growth_mb': (rss_after - rss_before) / 1024,
+    'frame_mb': df.memory_usage(deep=True).sum() / 1e6,
+}}))
+"""
+
+
+def run_probe(mode, csv_path, cache_dir):
+    code = PROBE.format(root=ROOT, mode=mode, csv=csv_path, cache=cache_dir)
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def best_of(mode, csv_path, cache_dir, repeat):
+    runs = [run_probe(mode, csv_path, cache_dir) for _ in range(repeat)]
+    return min(runs, key=lambda r: r['load_seconds'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare cold-start load time and RSS: CSV parse vs columnar cache.')
+    parser.add_argument('csv', nargs='?', default=os.path.join(ROOT, data_store.CSV_PATH))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cache_dir = data_store.cache_dir_for(args.csv)
+    start = time.perf_counter()
+    data_store.build_cache(args.csv, cache_dir)
+    build_seconds = time.perf_counter() - start
+
+    results = {
+        'rows': data_store.read_meta(cache_dir)['rows'],
+        'build_seconds': build_seconds,
+        'csv': best_of('csv', args.csv, cache_dir, args.repeat),
+        'columnar': best_of('columnar', args.csv, cache_dir, args.repeat),
+    }
+
+    print(f"rows: {results['rows']:,}   one-time conversion: {build_seconds:.2f}s")
+    print(f"{'path':<10} {'load (s)':>10} {'RSS (MB)':>9} {'peak RSS (MB)':>14} {'RSS growth (MB)':>16} {'frame (MB)':>11}")
+    for mode in ['csv', 'columnar']:
+        r = results[mode]
+        print(f"{mode:<10} {r['load_seconds']:>10.3f} {r['rss_mb']:>9.1f} {r['peak_rss_mb']:>14.1f} {r['rss_growth_mb']:>16.1f} {r['frame_mb']:>11.1f}")
+    print(json.dumps(results))
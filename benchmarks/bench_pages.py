@@ -0,0 +1,318 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cleaning
+import data_store
+import synthetic
+
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = ['10k', '100k']
+
+# Sidebar selections, as positions in the room type / neighbourhood options (None = all)
+SELECTIONS = {
+    'all': (None, None),
+    'one_room_type': ([0], None),
+    'two_boroughs': (None, [0, 1]),
+    'narrow': ([0], [0]),
+}
+
+# (page, variant, steps). Each step is a list of (widget kind, label, value)
+# set before one rerun; only the last rerun is measured. The page and the
+# sidebar selection are set together in the rerun before the first step.
+SCENARIOS = [
+    ('Data Overview', 'default', []),
+    ('Data Overview', 'sorted by price', [[('selectbox', 'Sort by', 'price')]]),
+    ('Data Visualization Playground', 'univariate numeric', [[('selectbox', 'Select a column', 'price')]]),
+    ('Data Visualization Playground', 'univariate categorical', [[('selectbox', 'Select a column', 'room_type')]]),
+    ('Data Visualization Playground', 'numeric vs numeric', [
+        [('radio', 'Select plot type', 'Bivariate')],
+        [('selectbox', 'Select X-axis column', 'price'), ('selectbox', 'Select Y-axis column', 'service_fee')],
+    ]),
+    ('Data Visualization Playground', 'categorical vs numeric', [
+        [('radio', 'Select plot type', 'Bivariate')],
+        [('selectbox', 'Select X-axis column', 'neighbourhood_group'), ('selectbox', 'Select Y-axis column', 'price')],
+    ]),
+    ('Data Visualization Playground', 'numeric vs categorical', [
+        [('radio', 'Select plot type', 'Bivariate')],
+        [('selectbox', 'Select X-axis column', 'price'), ('selectbox', 'Select Y-axis column', 'room_type')],
+    ]),
+    ('Data Visualization Playground', 'categorical vs categorical', [
+        [('radio', 'Select plot type', 'Bivariate')],
+        [('selectbox', 'Select X-axis column', 'room_type'), ('selectbox', 'Select Y-axis column', 'neighbourhood_group')],
+    ]),
+    ('Correlation Heatmap', 'pearson', []),
+    ('Correlation Heatmap', 'spearman', [[('radio', 'Method', 'Spearman')]]),
+    ('Analysis Questions', 'all questions', [[('selectbox', 'Question', 'all')]]),
+    ('Listings Map', 'cells', []),
+    ('Listings Map', 'points', [[('slider', 'Zoom', 15)]]),
+]
+
+FIGURE_ELEMENTS = ['plotly_chart', 'arrow_vega_lite_chart']
+TABLE_ELEMENTS = ['dataframe']
+
+# Below this many seconds a slowdown is treated as noise when comparing reports
+MIN_SECONDS = 0.05
+# Slack on peak memory growth when comparing reports
+MIN_MEMORY_MB = 10
+
+
+# -----------------------
+# Memory probes (Linux: the peak can be reset between runs)
+# -----------------------
+def proc_status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def current_rss_mb():
+    rss = proc_status_mb('VmRSS')
+    return rss if rss is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_rss_mb():
+    peak = proc_status_mb('VmHWM')
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# -----------------------
+# Worker: runs inside the dataset folder, so the app finds its CSV
+# -----------------------
+def new_session():
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=3600)
+
+
+def widget(at, kind, label):
+    for w in getattr(at, kind):
+        if w.label == label:
+            return w
+    raise LookupError(f'No {kind} labelled {label!r}')
+
+
+def payload_bytes(at, kinds):
+    return sum(el.proto.ByteSize() for kind in kinds for el in at.get(kind))
+
+
+def measured_run(at):
+    gc.collect()
+    rss_before = current_rss_mb()
+    resettable = reset_peak()
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    return {
+        'seconds': seconds,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak,
+        'peak_growth_mb': max(0.0, peak - rss_before) if resettable else None,
+        'figures': sum(len(at.get(kind)) for kind in FIGURE_ELEMENTS),
+        'figure_bytes': payload_bytes(at, FIGURE_ELEMENTS),
+        'table_bytes': payload_bytes(at, TABLE_ELEMENTS),
+        'errors': [str(e.value) for e in at.exception],
+    }
+
+
+def run_scenario(page, steps, selection):
+    at = new_session()
+    at.run()
+
+    room_idx, borough_idx = SELECTIONS[selection]
+    widget(at.sidebar, 'radio', 'Go to').set_value(page)
+    for label, idx in [('Select Room Types', room_idx), ('Select Neighbourhoods', borough_idx)]:
+        if idx is not None:
+            box = widget(at.sidebar, 'multiselect', label)
+            box.set_value([box.options[i] for i in idx if i < len(box.options)])
+
+    for step in steps:
+        at.run()
+        for kind, label, value in step:
+            widget(at, kind, label).set_value(value)
+    return measured_run(at)
+
+
+def run_worker(selections, pages):
+    results = []
+
+    start = time.perf_counter()
+    data_store.ensure_cache(cleaning.CLEAN_CSV_PATH)
+    rows = data_store.read_meta(data_store.cache_dir_for(cleaning.CLEAN_CSV_PATH))['rows']
+    cache_seconds = time.perf_counter() - start
+
+    # First run builds the shared, process-wide resources (indexes, cube, ...)
+    startup = measured_run(new_session())
+    startup.update({'page': 'startup', 'variant': 'cold', 'selection': 'all', 'cache_seconds': cache_seconds})
+    results.append(startup)
+
+    # Warm up plotly's import-time and template work so the first page measured isn't penalised
+    import plotly.express as px
+    px.scatter(x=[0, 1], y=[0, 1]).to_json()
+
+    for selection in selections:
+        for page, variant, steps in SCENARIOS:
+            if pages and page not in pages:
+                continue
+            result = run_scenario(page, steps, selection)
+            result.update({'page': page, 'variant': variant, 'selection': selection})
+            results.append(result)
+            print(f"  {selection:<14} {page:<30} {variant:<28} {result['seconds']:7.2f}s", file=sys.stderr)
+
+    for r in results:
+        r['rows'] = rows
+    return results
+
+
+# -----------------------
+# Driver
+# -----------------------
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ensure_dataset(data_dir, size):
+    csv_path = os.path.join(data_dir, size, cleaning.CLEAN_CSV_PATH)
+    if not os.path.exists(csv_path):
+        n_rows = synthetic.SIZES[size] if size in synthetic.SIZES else int(size)
+        print(f'Generating {n_rows:,} rows into {csv_path}', file=sys.stderr)
+        synthetic.write_csv(csv_path, n_rows)
+    return os.path.dirname(csv_path)
+
+
+def run_size(data_dir, size, selections, pages):
+    # One interpreter per size: shared Streamlit resources and peak memory
+    # from one dataset must not leak into the next
+    folder = ensure_dataset(data_dir, size)
+    fd, out_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', out_path, '--selections', *selections]
+        if pages:
+            cmd += ['--pages', *pages]
+        subprocess.run(cmd, cwd=folder, check=True)
+        with open(out_path) as f:
+            results = json.load(f)
+    finally:
+        os.remove(out_path)
+    for r in results:
+        r['size'] = size
+    return results
+
+
+def result_key(r):
+    return (r['size'], r['page'], r['variant'], r['selection'])
+
+
+def compare(report, baseline, tolerance):
+    # Regressions: slower, more peak memory or a bigger payload than the
+    # baseline by more than the tolerance (and more than the noise floor)
+    base = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'size':<6} {'page':<30} {'variant':<28} {'selection':<14} {'time':>7} {'memory':>7} {'payload':>8}")
+    for r in report['results']:
+        b = base.get(result_key(r))
+        if b is None:
+            continue
+
+        def ratio(field):
+            return r[field] / b[field] if b.get(field) and r.get(field) is not None else float('nan')
+
+        bytes_now = r['figure_bytes'] + r['table_bytes']
+        bytes_before = b['figure_bytes'] + b['table_bytes']
+        payload = bytes_now / bytes_before if bytes_before else float('nan')
+        print(f"{r['size']:<6} {r['page']:<30} {r['variant']:<28} {r['selection']:<14} "
+              f"{ratio('seconds'):7.2f} {ratio('peak_growth_mb'):7.2f} {payload:8.2f}")
+
+        if r['seconds'] > b['seconds'] * (1 + tolerance) and r['seconds'] - b['seconds'] > MIN_SECONDS:
+            regressions.append((result_key(r), 'seconds', b['seconds'], r['seconds']))
+        if (r['peak_growth_mb'] is not None and b['peak_growth_mb'] is not None
+                and r['peak_growth_mb'] > b['peak_growth_mb'] * (1 + tolerance) + MIN_MEMORY_MB):
+            regressions.append((result_key(r), 'peak_growth_mb', b['peak_growth_mb'], r['peak_growth_mb']))
+        if bytes_now > bytes_before * (1 + tolerance):
+            regressions.append((result_key(r), 'payload_bytes', bytes_before, bytes_now))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drive every app page headlessly over synthetic datasets and record time, memory and payload.')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help=f"any of {', '.join(synthetic.SIZES)} or row counts")
+    parser.add_argument('--selections', nargs='+', default=list(SELECTIONS), choices=list(SELECTIONS))
+    parser.add_argument('--pages', nargs='+', default=None, help='only these pages (default: all)')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'synthetic'))
+    parser.add_argument('--report', default='bench_pages.json', help='where to write the JSON report')
+    parser.add_argument('--compare', default=None, help='baseline report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, 'w') as f:
+            json.dump(run_worker(args.selections, args.pages), f)
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        results += run_size(args.data_dir, size, args.selections, args.pages)
+
+    report = {
+        'version': REPORT_VERSION,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    errors = [r for r in results if r['errors']]
+    print(f"{'size':<6} {'page':<30} {'variant':<28} {'selection':<14} {'seconds':>8} {'peak MB':>8} {'payload KB':>11}")
+    for r in results:
+        growth = r['peak_growth_mb']
+        print(f"{r['size']:<6} {r['page']:<30} {r['variant']:<28} {r['selection']:<14} {r['seconds']:8.2f} "
+              f"{growth if growth is not None else float('nan'):8.1f} {(r['figure_bytes'] + r['table_bytes']) / 1e3:11.1f}")
+    print(f'Wrote {args.report}')
+
+    failed = bool(errors)
+    for r in errors:
+        print(f"ERROR {result_key(r)}: {r['errors'][0]}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for key, field, before, after in regressions:
+            print(f'REGRESSION {key}: {field} {before:.3g} -> {after:.3g}')
+        failed = failed or bool(regressions)
+
+    sys.exit(1 if failed else 0)
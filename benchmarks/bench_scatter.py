@@ -0,0 +1,49 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_store
+import scatter
+
+
+PAIRS = [
+    ('price', 'service_fee'),
+    ('price', 'calculated_host_listings_count'),
+    (None, 'price'),
+]
+
+
+def measure(build):
+    # Render time covers figure construction and the JSON the browser receives
+    start = time.perf_counter()
+    payload = build().to_json()
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'payload_mb': len(payload) / 1e6}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scatter figure payload size and render time, before and after reduction.')
+    parser.add_argument('csv', nargs='?', default=os.path.join(ROOT, data_store.CSV_PATH))
+    parser.add_argument('--max-points', type=int, default=scatter.POINT_LIMIT)
+    args = parser.parse_args()
+
+    df = data_store.load_dataset(args.csv)
+    # Warm up plotly's import-time and template work so the first row isn't penalised
+    scatter.figure(df.head(10), 'price', 'service_fee', title='warm-up').to_json()
+    results = []
+    print(f"rows: {len(df):,}   max points: {args.max_points:,}")
+    print(f"{'x':<10} {'y':<32} {'mode':<8} {'seconds':>8} {'payload (MB)':>13}")
+    for x, y in PAIRS:
+        runs = {'Raw': measure(lambda: scatter.figure(df, x, y, title='raw'))}
+        for mode in ['Density', 'Sample']:
+            runs[mode] = measure(lambda: scatter.figure(
+                df, x, y, scatter.reduce(df, x, y, args.max_points, mode), title=mode))
+        for mode, r in runs.items():
+            print(f"{x or 'index':<10} {y:<32} {mode:<8} {r['seconds']:>8.3f} {r['payload_mb']:>13.2f}")
+        results.append({'x': x, 'y': y, **runs})
+    print(json.dumps({'rows': len(df), 'max_points': args.max_points, 'results': results}))
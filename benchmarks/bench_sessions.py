@@ -0,0 +1,89 @@
+import argparse
+import gc
+import json
+import os
+import resource
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest
+
+
+PAGES = ['Data Overview', 'Correlation Heatmap', 'Analysis Questions']
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def open_session(pages, room_types):
+    # Each AppTest is its own session; keeping it alive keeps its state alive.
+    # It visits every page in turn, so each page's per-session state is kept.
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=300)
+    at.run()
+    if room_types is not None:
+        at.sidebar.multiselect[0].set_value(room_types).run()
+    for page in pages:
+        at.sidebar.radio[0].set_value(page).run()
+        if at.exception:
+            raise RuntimeError(f'{page}: {at.exception[0].value}')
+    return at
+
+
+def open_sessions(sessions, n, pages, room_types):
+    for i in range(n):
+        # Alternate between the default and a narrowed selection
+        selection = None if len(sessions) % 2 else room_types[: max(1, len(room_types) // 2)]
+        sessions.append(open_session(pages, selection))
+    gc.collect()
+    return current_rss_mb()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Open N then 2N simulated sessions and check that memory stays flat.')
+    parser.add_argument('--sessions', type=int, default=15, help='N: RSS is compared between N and 2N open sessions')
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--max-growth', type=float, default=3.0,
+                        help='allowed RSS growth per extra session, in MB, whatever the dataset size')
+    args = parser.parse_args()
+
+    # The app reads Airbnb_Cleaned.csv relative to the working directory.
+    # Two warm-up sessions fill the shared caches for both selections.
+    first = open_session(args.pages, None)
+    room_types = first.sidebar.multiselect[0].options
+    dataset_mb = os.path.getsize('Airbnb_Cleaned.csv') / 1e6
+    sessions = [first]
+    warm_rss = open_sessions(sessions, 1, args.pages, room_types)
+
+    # The first N sessions may still fill per-selection caches; the next N
+    # only add what every session costs, which must not depend on the data
+    n_rss = open_sessions(sessions, args.sessions, args.pages, room_types)
+    two_n_rss = open_sessions(sessions, args.sessions, args.pages, room_types)
+    per_session = (two_n_rss - n_rss) / args.sessions
+    report = {
+        'sessions': len(sessions),
+        'pages': args.pages,
+        'csv_mb': dataset_mb,
+        'warm_rss_mb': warm_rss,
+        'n_rss_mb': n_rss,
+        '2n_rss_mb': two_n_rss,
+        'first_n_growth_per_session_mb': (n_rss - warm_rss) / args.sessions,
+        'growth_per_session_mb': per_session,
+    }
+    print(json.dumps(report))
+
+    if per_session > args.max_growth:
+        print(f'FAIL: {per_session:.2f} MB per session from N={args.sessions} to 2N exceeds {args.max_growth:.2f} MB '
+              f'({per_session / dataset_mb:.1%} of the {dataset_mb:.1f} MB CSV)')
+        sys.exit(1)
+    print(f'OK: {per_session:.2f} MB per session from N={args.sessions} to 2N (limit {args.max_growth:.2f} MB, '
+          f'{per_session / dataset_mb:.1%} of the {dataset_mb:.1f} MB CSV)')
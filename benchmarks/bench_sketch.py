@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_store
+import sketch
+from bench_cube import filter_mask
+
+
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+GROUPINGS = [[], ['neighbourhood_group'], ['room_type'], ['neighbourhood_group', 'room_type']]
+
+
+def selections(df):
+    # Everything, each room type / borough alone, and a narrow combination
+    room_types = sorted(df['room_type'].dropna().unique().tolist())
+    boroughs = sorted(df['neighbourhood_group'].dropna().unique().tolist())
+    yield 'all', None
+    for value in room_types:
+        yield f'room_type={value}', {'room_type': [value]}
+    for value in boroughs:
+        yield f'neighbourhood_group={value}', {'neighbourhood_group': [value]}
+    yield 'narrow', {'room_type': room_types[:1], 'neighbourhood_group': boroughs[:2]}
+
+
+def rank_errors(values, estimates, qs):
+    # How far each estimate's rank in the exact data is from its target q.
+    # Ties give a value a range of ranks; the estimate is off only if q is
+    # outside it. np.quantile itself can be up to 1/n off by this measure.
+    x = np.sort(values)
+    below = np.searchsorted(x, estimates, side='left') / len(x)
+    upto = np.searchsorted(x, estimates, side='right') / len(x)
+    return np.maximum(0.0, np.maximum(below - qs, qs - upto))
+
+
+def check(df, sketches, measure, by, selection):
+    mask = filter_mask(df, selection)
+    rows = df[mask]
+    start = time.perf_counter()
+    if by:
+        estimated = sketches.rollup(by, measure, QUANTILES, selection)
+    else:
+        estimated = sketches.total(measure, QUANTILES, selection).to_frame().T
+    sketch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    groups = rows.groupby(by, observed=True, sort=True)[measure] if by else [((), rows[measure])]
+    exact = {key: values.dropna().to_numpy() for key, values in groups}
+    for values in exact.values():
+        if len(values):
+            np.quantile(values, QUANTILES)
+    exact_seconds = time.perf_counter() - start
+
+    worst = {'rank_error': 0.0, 'allowed': 0.0, 'value_error': 0.0, 'failures': 0, 'groups': 0}
+    for key, values in exact.items():
+        if not len(values):
+            continue
+        if len(by) == 1 and isinstance(key, tuple):
+            key = key[0]
+        row = estimated.loc[key] if by else estimated.iloc[0]
+        estimates = row[QUANTILES].to_numpy(dtype='float64')
+        errors = rank_errors(values, estimates, np.array(QUANTILES))
+        allowed = sketch.RANK_ERROR + 1 / len(values)
+        spread = values.max() - values.min() or 1.0
+        worst['groups'] += 1
+        worst['failures'] += int((errors > allowed).sum()) + int(row['count'] != len(values))
+        if errors.max() - allowed > worst['rank_error'] - worst['allowed']:
+            worst['rank_error'], worst['allowed'] = float(errors.max()), allowed
+        worst['value_error'] = max(worst['value_error'], float(np.abs(estimates - np.quantile(values, QUANTILES)).max() / spread))
+    return worst, sketch_seconds, exact_seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantile sketch accuracy and speed against exact np.quantile, under sidebar filters.')
+    parser.add_argument('csv', nargs='?', default=os.path.join(ROOT, data_store.CSV_PATH))
+    parser.add_argument('--compression', type=int, default=sketch.COMPRESSION)
+    args = parser.parse_args()
+
+    df = data_store.plain(data_store.load_dataset(args.csv))
+    start = time.perf_counter()
+    sketches = sketch.CellSketches(df, compression=args.compression)
+    build_seconds = time.perf_counter() - start
+    centroids = sum(len(d.means) for d in sketches.digests.values())
+    print(f"rows: {len(df):,}   cells: {len(sketches.cells):,}   centroids: {centroids:,}   build: {build_seconds:.2f}s")
+    print(f"{'measure':<18} {'by':<32} {'selection':<36} {'rank err':>9} {'allowed':>8} {'value err':>10} {'sketch ms':>10} {'exact ms':>9}")
+
+    results = []
+    failures = 0
+    for measure in sketches.measures:
+        for by in GROUPINGS:
+            for name, selection in selections(df):
+                worst, sketch_seconds, exact_seconds = check(df, sketches, measure, by, selection)
+                failures += worst['failures']
+                print(f"{measure:<18} {'+'.join(by) or '(all)':<32} {name:<36} {worst['rank_error']:>9.4f} {worst['allowed']:>8.4f} "
+                      f"{worst['value_error']:>10.4f} {sketch_seconds * 1e3:>10.1f} {exact_seconds * 1e3:>9.1f}")
+                results.append({'measure': measure, 'by': by, 'selection': name, **worst,
+                                 'sketch_seconds': sketch_seconds, 'exact_seconds': exact_seconds})
+
+    print(json.dumps({'rows': len(df), 'compression': args.compression, 'rank_error_bound': sketch.RANK_ERROR,
+                      'build_seconds': build_seconds, 'failures': failures, 'results': results}))
+    if failures:
+        print(f"{failures} estimates outside the rank error bound", file=sys.stderr)
+        sys.exit(1)
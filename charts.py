@@ -0,0 +1,248 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+import plotly.express as px
+
+import data_store
+import query
+import sketch
+import tracing
+
+
+# -----------------------
+# Analysis Questions registry
+# -----------------------
+# Each question is an independent chart unit: a heading plus a build function
+# returning the notes (str) and figures, in display order. Build functions only
+# read from ctx, so the app and batch exports share the same definitions:
+#   ctx['df']             filtered frame (DataFrame or query.View)
+#   ctx['cube']           cube.Cube over the full dataset
+#   ctx['selections']     sidebar selection (column -> values)
+#   ctx['scatter_figure'] callable(x, y, title=..., labels=...) -> figure
+#   ctx['sketches']       sketch.CellSketches over the full dataset (optional)
+#   ctx['stat']           'mean' or a key of sketch.QUANTILE_STATS (optional)
+# A question lists the render settings it depends on (SETTINGS names), so
+# its cache key leaves out the ones it ignores.
+QUESTIONS = OrderedDict()
+
+# Render settings a question can depend on besides the filter and the data,
+# and the ctx entries that carry them
+SETTINGS = {
+    'scatter_limit': ['scatter_figure'],
+    'scatter_mode': ['scatter_figure'],
+    'stat': ['stat'],
+}
+
+# Chart title prefix per statistic
+STAT_LABELS = {'mean': 'Average', 'median': 'Median', 'p90': '90th Percentile', 'p99': '99th Percentile'}
+
+
+def question(qid, heading, requires=(), settings=()):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f'Unknown settings for {qid}: {sorted(unknown)}')
+
+    def register(build):
+        QUESTIONS[qid] = {'id': qid, 'heading': heading, 'requires': requires, 'settings': tuple(settings), 'build': build}
+        return build
+    return register
+
+
+def cache_key(qid, selection_key, data_version, settings):
+    # Only the settings the question uses, so e.g. moving the scatter slider
+    # leaves every chart without a scatter plot cached
+    q = QUESTIONS[qid]
+    return (qid, selection_key, data_version) + tuple((name, settings[name]) for name in q['settings'])
+
+
+def build_question(qid, ctx):
+    # Aggregations show up as child spans; the rest is figure construction.
+    # ctx entries for settings the question did not declare are left out, so
+    # it cannot depend on something its cache key ignores.
+    q = QUESTIONS[qid]
+    declared = {key for name in q['settings'] for key in SETTINGS[name]}
+    hidden = {key for keys in SETTINGS.values() for key in keys} - declared
+    ctx = {key: value for key, value in ctx.items() if key not in hidden}
+    with tracing.span(qid, 'question', rows=len(ctx['df'])):
+        return q['build'](ctx)
+
+
+def rollup(ctx, by, measure, exclude=None):
+    # One measure per group under the sidebar filter, as the chosen statistic:
+    # percentiles come from the quantile sketches, means (and measures
+    # without a sketch) from the cube. Returns the frame and the title prefix.
+    stat = ctx.get('stat', 'mean')
+    sketches = ctx.get('sketches')
+    if stat in sketch.QUANTILE_STATS and sketches is not None and measure in sketches.measures:
+        q = sketch.QUANTILE_STATS[stat]
+        frame = sketches.rollup(by, measure, [q], ctx['selections'], exclude)[[q]].rename(columns={q: measure})
+        return frame, STAT_LABELS[stat]
+    return ctx['cube'].rollup(by, measure, ctx['selections'], exclude=exclude), STAT_LABELS['mean']
+
+
+@question('q1', "1) What is the relation between listing price and factors like : service fee, room type, location, reviews, host size, etc..?", settings=('scatter_limit', 'scatter_mode'))
+def q1(ctx):
+    return [
+        """- The strong linear relationship between price and service fee indicates that service fee is mostly caclulated as a percentage from price. 
+                While the points surrounding the straight line suggests some hosts use other methods like a fixed figure to set the service fee amount.""",
+        ctx['scatter_figure']('price', 'service_fee', labels={'price': 'Price ($)', 'service_fee': 'Service Fee ($)'}, title='Price vs Service Fee'),
+        """- Airbnb market is dominated by small hosts.""",
+        """- A minority of hosts control many listings.""",
+        """- Professional hosts exist across all price levels.""",
+        """- Price is independent of host size.""",
+        ctx['scatter_figure']('price', 'calculated_host_listings_count', labels={'calculated_host_listings_count': 'Listings per Host'}, title='Price vs Host Listings Count'),
+    ]
+
+
+@question('q2', "2) What is the distribution of room types by neighbourhood?")
+def q2(ctx):
+    source, counts_col = query.histogram_source(ctx['df'], ['neighbourhood_group', 'room_type'])
+    return [
+        """- Manhattan and Brooklyn dominate the market, with the highest number of listings, especially entire homes and private rooms.""",
+        """- Queens has moderate supply, while Staten Island and the Bronx contribute only a small share of total listings across all room types.""",
+        px.histogram(data_store.plain(source), x='neighbourhood_group', y=counts_col, color='room_type', title='Listings by Neighbourhood Group and Room Type', labels={'neighbourhood_group': 'Neighbourhood', 'room_type': 'Room Type'}),
+    ]
+
+
+@question('q3', "3) What is the average price per neighbhourhood?", settings=('stat',))
+def q3(ctx):
+    neighborhood_price, stat = rollup(ctx, 'neighbourhood_group', 'price')
+    neighborhood_price = neighborhood_price['price'].round(2).sort_values(ascending=False).reset_index()
+    return [
+        """- The average prices are nearly identical across all neighbourhood groups, indicating minimal price variation by neighbourhood.""",
+        px.bar(neighborhood_price, x='neighbourhood_group', y='price', title=f'{stat} Price by Neighbourhood Group', text_auto='.3s', labels={'price': 'Price', 'neighbourhood_group': 'Neighbourhood'}, color='neighbourhood_group'),
+    ]
+
+
+@question('q4', "4) What is the average price per room type?", settings=('stat',))
+def q4(ctx):
+    room_price, stat = rollup(ctx, 'room_type', 'price')
+    room_price = room_price['price'].round(2).sort_values(ascending=False).reset_index()
+    return [
+        """- Average prices are relatively similar across room types, with hotel rooms slightly higher, indicating limited price differentiation by accommodation category.""",
+        px.bar(room_price, x='room_type', y='price', title=f'{stat} Price by Room Type', text_auto='.3s', labels={'price': 'Price', 'room_type': 'Room Type'}, color='room_type'),
+    ]
+
+
+@question('q5', "5) What is the average minimum nights for each type of listing (aka room type) in each neighbourhood?", settings=('stat',))
+def q5(ctx):
+    room_nights, stat = rollup(ctx, ['room_type','neighbourhood_group'], 'minimum_nights')
+    room_nights = room_nights.round(2).reset_index()
+    return [
+        """- Entire homes/apartments generally require longer minimum stays, especially in Manhattan, indicating a focus on longer bookings.""",
+        """- Hotel and shared rooms tend to have shorter minimum night requirements, making them more flexible for short-term stays.""",
+        px.bar(room_nights, x='neighbourhood_group', y='minimum_nights', color='room_type', barmode='group', title=f'{stat} Minimum Nights by Neighbourhood Group & Room Type', labels={'minimum_nights': 'Minimum Nights', 'neighbourhood_group': 'Neighbourhood', 'room_type' : 'Room Type'}),
+    ]
+
+
+@question('q6', "6) What is the average rating for each type of listing (aka room type) in each neighbourhood?", requires=('review_rate_number',))
+def q6(ctx):
+    room_rating = ctx['cube'].rollup(['room_type','neighbourhood_group'], 'review_rate_number', ctx['selections']).round(2).reset_index()
+    return [
+        """- Average ratings are fairly consistent across all neighbourhoods and room types, generally ranging between 3.2 and 3.9.""",
+        """- Hotel rooms and private rooms tend to receive slightly higher ratings compared to entire homes and shared rooms in most neighbourhoods.""",
+        px.bar(room_rating, x='neighbourhood_group', y='review_rate_number', color='room_type', barmode='group', title='Average Review Rate Number by Neighbourhood Group & Room Type', labels={'review_rate_number': 'Rating Number', 'neighbourhood_group': 'Neighbourhood', 'room_type' : 'Room Type'}),
+    ]
+
+
+@question('q7', "7) What is the trend of Price by Last Review Year and Neighbourhood Group?", requires=('year',), settings=('stat',))
+def q7(ctx):
+    price_trend, stat = rollup(ctx, ['year','neighbourhood_group'], 'price', exclude={'year': [2000]})
+    price_trend = price_trend.reset_index().round(2)
+    return [
+        """- After some early fluctuations, average prices across all neighbourhoods remain relatively stable from 2017 onward.""",
+        px.line(price_trend, x='year', y='price', color='neighbourhood_group', markers=True, title=f'Trend of {stat} Price by Last Review Year and Neighbourhood'),
+    ]
+
+
+@question('q8', "8) What is the average price per Neighbhorhood per Room Type?", settings=('stat',))
+def q8(ctx):
+    plot_price, stat = rollup(ctx, ['neighbourhood_group','room_type'], 'price')
+    plot_price = plot_price.round(2).reset_index()
+    return [
+        """- Average prices are fairly consistent across neighbourhoods for most room types, though hotel rooms show greater variation compared to other accommodation categories.""",
+        px.bar(plot_price, x='neighbourhood_group', y='price', color='room_type', barmode='group', title=f'{stat} Price per Neighborhood per Room Type', labels={'neighbourhood_group': 'Neighborhood Group', 'price': 'Price', 'room_type': 'Room Type'}),
+    ]
+
+
+@question('q9', "9) What is the average Number of Reviews per Neighbhorhood per Room Type?")
+def q9(ctx):
+    plot_review = ctx['cube'].rollup(['neighbourhood_group','room_type'], 'number_of_reviews', ctx['selections']).round(2).reset_index()
+    return [
+        """- Manhattan shows the highest average number of reviews, particularly for hotel rooms, indicating stronger guest activity and demand.""",
+        """- Staten Island and the Bronx have noticeably fewer reviews across most room types, suggesting lower overall booking volume.""",
+        px.bar(plot_review, x='neighbourhood_group', y='number_of_reviews', color='room_type', barmode='group', title='Average number of reviews per Neighborhood per Room Type', labels={'neighbourhood_group': 'Neighborhood Group', 'number_of_reviews': 'number of reviews', 'room_type': 'Room Type'}),
+    ]
+
+
+@question('q10', "10) What is the average price by cancellation policy and instant bookable status?", requires=('cancellation_policy', 'instant_bookable'), settings=('stat',))
+def q10(ctx):
+    agg, stat = rollup(ctx, ['cancellation_policy','instant_bookable'], 'price')
+    agg = agg.reset_index()
+    return [
+        """- Listings with strict cancellation policies tend to have slightly higher average prices compared to flexible and moderate policies.""",
+        """- Instant bookable status shows minimal impact on price, as average prices remain relatively similar across True and False categories.""",
+        px.bar(agg, x='cancellation_policy', y='price', color='instant_bookable', barmode='group', title=f'{stat} Price by Cancellation Policy & Instant Bookable', text_auto='.3s', labels={'price': 'Price', 'cancellation_policy': 'Cancellation Policy', 'instant_bookable': 'Instant Bookable'}),
+    ]
+
+
+@question('q11', "11) Which locations have the strongest demand?")
+def q11(ctx):
+    location_demand = ctx['cube'].rollup('neighbourhood_group', ['reviews_per_month','number_of_reviews','availability_365','price','n_rows'], ctx['selections']).rename(columns={'n_rows':'listing_count'})
+    location_demand = location_demand.round(2).reset_index()
+    return [
+        """- Queens shows the highest average reviews per month, indicating relatively stronger booking activity.""",
+        """- Brooklyn and Manhattan have slightly lower averages, suggesting demand is more evenly distributed rather than heavily concentrated.""",
+        px.bar(location_demand, x='neighbourhood_group', y='reviews_per_month', title='Average Reviews per Month by Neighbourhood', labels={'reviews_per_month': 'Avg Reviews per Month', 'neighbourhood_group': 'Neighbourhood'}, color='neighbourhood_group'),
+    ]
+
+
+# -----------------------
+# Memoisation
+# -----------------------
+class ChartCache:
+    # Bounded LRU of built chart units, shared by every session. Keys come
+    # from cache_key(): question id, filter selection, data version and the
+    # render settings that question uses.
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        # Build outside the lock so one slow chart doesn't block other sessions
+        items = build()
+        size = len(pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL))
+
+        with self.lock:
+            self.entries[key] = items
+            self.sizes[key] = size
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                old_key, _ = self.entries.popitem(last=False)
+                del self.sizes[old_key]
+                self.evictions += 1
+        return items
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': sum(self.sizes.values()),
+            }
@@ -0,0 +1,253 @@
+import argparse
+import io
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+RAW_CSV_PATH = 'Airbnb_Open_Data.csv'
+CLEAN_CSV_PATH = 'Airbnb_Cleaned.csv'
+CHUNK_ROWS = 100_000
+
+# Raw header -> cleaned name, after lower-casing and replacing spaces with underscores
+RENAMES = {
+    'lat': 'latitude',
+    'long': 'longitude',
+    'last_review': 'last_review_date',
+}
+
+# Known misspellings in the raw neighbourhood_group column
+NEIGHBOURHOOD_GROUP_FIXES = {
+    'brookln': 'Brooklyn',
+    'manhatan': 'Manhattan',
+}
+
+MONEY_COLUMNS = ['price', 'service_fee']
+
+NUMERIC_COLUMNS = [
+    'id', 'host_id', 'latitude', 'longitude', 'construction_year',
+    'minimum_nights', 'number_of_reviews', 'reviews_per_month',
+    'review_rate_number', 'calculated_host_listings_count', 'availability_365',
+]
+
+OUTPUT_COLUMNS = [
+    'id', 'name', 'host_id', 'host_identity_verified', 'host_name',
+    'neighbourhood_group', 'neighbourhood', 'latitude', 'longitude',
+    'instant_bookable', 'cancellation_policy', 'room_type', 'construction_year',
+    'price', 'service_fee', 'minimum_nights', 'number_of_reviews',
+    'last_review_date', 'reviews_per_month', 'review_rate_number',
+    'calculated_host_listings_count', 'availability_365', 'year', 'host_type',
+    'price_range', 'price_bin', 'service_fee_bins', 'reviews_bin',
+    'review_bracket', 'review_permonth_bracket',
+]
+
+# Reviews with no date get this year; the app leaves it out of the price trend
+MISSING_YEAR = 2000
+
+# Fixed bin edges (not data-dependent) so every chunk is binned the same way
+PRICE_RANGES = ([0, 250, 500, 750, 1000, np.inf], ['0-250', '250-500', '500-750', '750-1000', '1000+'])
+PRICE_BINS = ([0, 200, 400, 600, 800, 1000, 1200, np.inf], ['0-200', '200-400', '400-600', '600-800', '800-1000', '1000-1200', '1200+'])
+SERVICE_FEE_BINS = ([0, 50, 100, 150, 200, np.inf], ['0-50', '50-100', '100-150', '150-200', '200+'])
+REVIEWS_BINS = ([-1, 0, 10, 50, 100, 200, np.inf], ['0', '1-10', '11-50', '51-100', '101-200', '200+'])
+REVIEW_BRACKETS = ([-1, 0, 10, 50, 100, np.inf], ['No reviews', 'Few', 'Moderate', 'Many', 'Very many'])
+REVIEW_PERMONTH_BRACKETS = ([-1, 0, 0.5, 1, 3, np.inf], ['None', 'Low', 'Medium', 'High', 'Very high'])
+
+
+# -----------------------
+# Stages (DataFrame -> DataFrame, vectorised, no cross-chunk state)
+# -----------------------
+def normalize_columns(df):
+    df = df.rename(columns=lambda c: c.strip().lower().replace(' ', '_'))
+    return df.rename(columns=RENAMES)
+
+
+def fix_categories(df):
+    for col in ['neighbourhood_group', 'room_type', 'cancellation_policy', 'host_identity_verified']:
+        if col in df.columns:
+            df[col] = df[col].str.strip()
+    if 'neighbourhood_group' in df.columns:
+        df['neighbourhood_group'] = df['neighbourhood_group'].replace(NEIGHBOURHOOD_GROUP_FIXES)
+    if 'instant_bookable' in df.columns:
+        df['instant_bookable'] = df['instant_bookable'].str.strip().str.upper().map({'TRUE': True, 'FALSE': False})
+    return df
+
+
+def parse_numbers(df):
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].str.replace(r'[$,\s]', '', regex=True), errors='coerce')
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def drop_invalid(df):
+    # Rows the analysis cannot use, plus obvious outliers
+    keep = (
+        df['price'].gt(0)
+        & df['neighbourhood_group'].notna()
+        & df['room_type'].notna()
+        & df['minimum_nights'].between(1, 365)
+    )
+    # Repeated rows are dropped by run(), once cleaned, in one place for the whole file
+    df = df[keep].copy()
+    df['availability_365'] = df['availability_365'].clip(0, 365)
+    return df
+
+
+def impute_reviews(df):
+    df['number_of_reviews'] = df['number_of_reviews'].fillna(0).astype('int64')
+    # No reviews means no reviews per month
+    no_reviews = df['number_of_reviews'].eq(0)
+    df['reviews_per_month'] = df['reviews_per_month'].mask(no_reviews, 0).fillna(0)
+    return df
+
+
+def add_year(df):
+    dates = pd.to_datetime(df['last_review_date'], errors='coerce', format='mixed')
+    df['last_review_date'] = dates.dt.strftime('%Y-%m-%d')
+    df['year'] = dates.dt.year.fillna(MISSING_YEAR).astype('int64')
+    return df
+
+
+def add_bins(df):
+    def binned(values, spec):
+        edges, labels = spec
+        return pd.cut(values, edges, labels=labels, right=True).astype(object)
+
+    df['price_range'] = binned(df['price'], PRICE_RANGES)
+    df['price_bin'] = binned(df['price'], PRICE_BINS)
+    df['service_fee_bins'] = binned(df['service_fee'], SERVICE_FEE_BINS)
+    df['reviews_bin'] = binned(df['number_of_reviews'], REVIEWS_BINS)
+    df['review_bracket'] = binned(df['number_of_reviews'], REVIEW_BRACKETS)
+    df['review_permonth_bracket'] = binned(df['reviews_per_month'], REVIEW_PERMONTH_BRACKETS)
+
+    listings = df['calculated_host_listings_count']
+    df['host_type'] = np.select([listings.le(1), listings.le(10)], ['Individual', 'Multi-listing'], 'Professional')
+    df['host_type'] = df['host_type'].where(listings.notna())
+    return df
+
+
+STAGES = [
+    normalize_columns,
+    fix_categories,
+    parse_numbers,
+    drop_invalid,
+    impute_reviews,
+    add_year,
+    add_bins,
+]
+
+
+def clean_chunk(chunk):
+    for stage in STAGES:
+        chunk = stage(chunk)
+    return chunk.reindex(columns=OUTPUT_COLUMNS)
+
+
+def row_hashes(df):
+    # One 64-bit hash per row. Numbers are hashed as float64 and everything
+    # else as objects, so the same row hashes the same in every chunk even
+    # when a column is int64 in one chunk and float64 (NaNs) in another.
+    numeric = df.select_dtypes('number').columns
+    stable = df.astype({col: 'float64' if col in numeric else object for col in df.columns})
+    return pd.util.hash_pandas_object(stable, index=False).to_numpy()
+
+
+def clean_chunk_csv(chunk):
+    # Formatting happens in the worker too; the parent only appends the text
+    cleaned = clean_chunk(chunk)
+    return cleaned.to_csv(header=False, index=False), len(cleaned), row_hashes(cleaned)
+
+
+def sorted_contains(sorted_values, values):
+    # Membership of each value in a sorted array, by binary search
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[pos] == values
+
+
+def drop_csv_rows(text, drop):
+    # Re-reads cleaned CSV text as strings and writes it back without the
+    # dropped rows; the round trip keeps every field exactly as it was
+    rows = pd.read_csv(io.StringIO(text), header=None, dtype=str, keep_default_na=False)
+    return rows[~drop].to_csv(header=False, index=False)
+
+
+# -----------------------
+# Driver
+# -----------------------
+def read_raw(raw_path, chunksize=CHUNK_ROWS):
+    # Everything as text so each chunk is typed by the stages, not by inference
+    return pd.read_csv(raw_path, chunksize=chunksize, dtype=str, keep_default_na=True)
+
+
+def run(raw_path=RAW_CSV_PATH, out_path=CLEAN_CSV_PATH, chunksize=CHUNK_ROWS, workers=None):
+    # Chunks are cleaned across a process pool and appended in input order.
+    # At most 2 x workers chunks are in flight, so memory stays bounded by the
+    # chunk size, not the input size, plus the hashes of the rows written:
+    # one sorted uint64 array, 8 bytes per row (16 briefly, while a chunk's
+    # hashes are merged in), about 8 MB per million rows.
+    # A cleaned row that repeats an earlier one, in this chunk or a previous
+    # one, is dropped, so the output is the same for every chunk size.
+    # Rows are compared after every stage: raw rows that only differ in
+    # something cleaning fills in (a blank vs 0 reviews per month with no
+    # reviews) are repeats.
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.cleaning-', suffix='.csv', dir=out_dir)
+    os.close(fd)
+
+    rows_in = rows_out = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, open(tmp_path, 'w', newline='') as out:
+            out.write(','.join(OUTPUT_COLUMNS) + '\n')
+            pending = deque()
+            seen = np.empty(0, dtype=np.uint64)
+
+            def write_next():
+                nonlocal rows_out, seen
+                text, n, hashes = pending.popleft().result()
+                drop = pd.Series(hashes).duplicated().to_numpy() | sorted_contains(seen, hashes)
+                if drop.any():
+                    text = drop_csv_rows(text, drop)
+                new = np.sort(hashes[~drop])
+                seen = np.insert(seen, np.searchsorted(seen, new), new)
+                out.write(text)
+                rows_out += n - int(drop.sum())
+
+            for chunk in read_raw(raw_path, chunksize):
+                rows_in += len(chunk)
+                pending.append(pool.submit(clean_chunk_csv, chunk))
+                if len(pending) >= max_in_flight:
+                    write_next()
+            while pending:
+                write_next()
+
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return rows_in, rows_out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clean the raw Airbnb CSV into the analysis-ready CSV, in parallel chunks.')
+    parser.add_argument('raw', nargs='?', default=RAW_CSV_PATH)
+    parser.add_argument('out', nargs='?', default=CLEAN_CSV_PATH)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    rows_in, rows_out = run(args.raw, args.out, args.chunksize, args.workers)
+    print(f'Read {rows_in:,} rows, wrote {rows_out:,} rows to {args.out}')
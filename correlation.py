@@ -0,0 +1,187 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_store
+import filter_index
+import query
+
+
+# Numeric columns that identify rows rather than measure anything
+IDENTIFIER_COLUMNS = ['id', 'host_id']
+
+
+def numeric_columns(df):
+    # Same columns as DataFrame.corr(numeric_only=True), minus identifiers
+    cols = df.select_dtypes(include=['number', 'bool']).columns
+    return [col for col in cols if col not in IDENTIFIER_COLUMNS]
+
+
+def moments(X):
+    # Pairwise-complete sufficient statistics of an (rows x cols) block with
+    # NaN for missing: for every pair (i, j) the sums only cover rows where
+    # both columns are present. All four are (cols x cols).
+    valid = ~np.isnan(X)
+    Z = np.where(valid, X, 0.0)
+    V = valid.astype('float64')
+    return {
+        'n': V.T @ V,
+        's': Z.T @ V,
+        'q': (Z * Z).T @ V,
+        'c': Z.T @ Z,
+    }
+
+
+def pearson(m):
+    n, sx, sxx, sxy = m['n'], m['s'], m['q'], m['c']
+    sy, syy = sx.T, sxx.T
+    cov = n * sxy - sx * sy
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = cov / np.sqrt(var_x * var_y)
+    # Constant columns leave only rounding error in the variance; treat them as zero
+    flat_x = ~(var_x > 1e-12 * n * sxx)
+    flat_y = ~(var_y > 1e-12 * n * syy)
+    r[(n < 2) | flat_x | flat_y] = np.nan
+    return np.clip(r, -1, 1)
+
+
+def average_ranks(sorted_values):
+    # 1-based ranks of already-sorted values, ties sharing their average rank
+    m = len(sorted_values)
+    if m == 0:
+        return np.empty(0)
+    starts = np.r_[0, np.flatnonzero(sorted_values[1:] != sorted_values[:-1]) + 1]
+    ends = np.r_[starts[1:], m]
+    return np.repeat((starts + ends + 1) / 2, ends - starts)
+
+
+class CorrelationStats:
+    # Moments per observed combination of the filter columns, computed once
+    # at load time. A Pearson matrix for any sidebar selection is the sum of
+    # the matching cells' moments, so it costs O(cells x cols^2), not rows.
+
+    def __init__(self, df, dimensions=filter_index.FILTER_COLUMNS):
+        self.columns = numeric_columns(df)
+        self.dimensions = [d for d in dimensions if d in df.columns]
+
+        frame = query.in_memory(df, self.columns + self.dimensions)
+        if frame is None:
+            self.cells, self.stats = self.chunked_stats(df)
+            return
+
+        X = np.column_stack([frame[col].to_numpy(dtype='float64', na_value=np.nan) for col in self.columns])
+        # Correlation is shift-invariant; centring keeps the raw sums well conditioned
+        X -= np.nanmean(X, axis=0)
+
+        groups = frame.groupby([frame[d] for d in self.dimensions], observed=True, dropna=False, sort=True)
+        cell_ids = groups.ngroup().to_numpy()
+        self.cells = data_store.plain(groups.size().reset_index(name='n_rows'))
+
+        order = np.argsort(cell_ids, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(cell_ids, minlength=len(self.cells)))]
+        stats = [moments(X[order[bounds[i]:bounds[i + 1]]]) for i in range(len(self.cells))]
+        self.stats = {key: np.stack([s[key] for s in stats]) for key in ['n', 's', 'q', 'c']}
+
+    def chunked_stats(self, view):
+        # Same cells and moments, accumulated chunk by chunk over a query.View:
+        # one pass for the column means, one for the per-cell moments
+        store = view.store
+
+        def block(idx):
+            return np.column_stack([store.raw(col, idx).astype('float64') for col in self.columns])
+
+        sums = np.zeros(len(self.columns))
+        counts = np.zeros(len(self.columns))
+        for idx in store.spans(view.rows):
+            X = block(idx)
+            valid = ~np.isnan(X)
+            sums += np.where(valid, X, 0.0).sum(axis=0)
+            counts += valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        radices = store.radices(self.dimensions)
+        cells = {}
+        for idx in store.spans(view.rows):
+            X = block(idx) - means
+            keys, cell_ids = np.unique(store.group_keys(self.dimensions, idx, radices), return_inverse=True)
+            order = np.argsort(cell_ids, kind='stable')
+            sizes = np.bincount(cell_ids, minlength=len(keys))
+            bounds = np.r_[0, np.cumsum(sizes)]
+            for i, key in enumerate(keys):
+                m = moments(X[order[bounds[i]:bounds[i + 1]]])
+                m['n_rows'] = sizes[i]
+                if key in cells:
+                    m = {name: cells[key][name] + value for name, value in m.items()}
+                cells[key] = m
+
+        keys = sorted(cells)
+        table = store.decode(self.dimensions, keys, radices)
+        table['n_rows'] = np.array([cells[key]['n_rows'] for key in keys], dtype='int64')
+        stats = {name: np.stack([cells[key][name] for key in keys]) for name in ['n', 's', 'q', 'c']}
+        return data_store.plain(table), stats
+
+    def pearson(self, selections=None):
+        mask = cube.cell_mask(self.cells, selections)
+        summed = {key: values[mask].sum(axis=0) for key, values in self.stats.items()}
+        return pd.DataFrame(pearson(summed), index=self.columns, columns=self.columns)
+
+    def spearman(self, df, sort_index, rows=None):
+        # Pearson over ranks within the filtered rows. Pairs involving a
+        # column with missing values are re-ranked over the rows where both
+        # are present, matching DataFrame.corr(method='spearman').
+        # Only the selected rows are read: each row's place in a column's
+        # cached sort order (SortIndex.places) orders the k selected values
+        # without re-sorting the column or allocating anything full-length.
+        # A rank matrix over query.MEMORY_BUDGET goes to a temporary
+        # memory-mapped file and its moments are summed chunk by chunk.
+        view = df if rows is None else df.take(rows)
+        k, n_cols = len(view), len(self.columns)
+
+        def ranks_within(j, keep=None):
+            # Average ranks of column j over the selected rows (keep: a subset of them)
+            col = self.columns[j]
+            places = sort_index.places(col, rows)
+            values = view[col].to_numpy(dtype='float64', na_value=np.nan)
+            if keep is not None:
+                places, values = places[keep], values[keep]
+            at = np.flatnonzero(places >= 0)
+            at = at[np.argsort(places[at], kind='stable')]
+            ranked = np.full(len(places), np.nan)
+            ranked[at] = average_ranks(values[at])
+            return ranked
+
+        with tempfile.TemporaryDirectory(prefix='spearman-') as tmp:
+            if k * 8 * n_cols <= query.MEMORY_BUDGET:
+                R = np.empty((k, n_cols))
+            else:
+                R = np.lib.format.open_memmap(os.path.join(tmp, 'ranks.npy'), mode='w+', dtype='float64',
+                                              shape=(k, n_cols), fortran_order=True)
+            present = np.empty((k, n_cols), dtype=bool)
+            for j in range(n_cols):
+                R[:, j] = ranks_within(j)
+                present[:, j] = ~np.isnan(R[:, j])
+
+            summed = None
+            for start in range(0, k, query.CHUNK_ROWS):
+                m = moments(np.asarray(R[start:start + query.CHUNK_ROWS]))
+                summed = m if summed is None else {key: summed[key] + value for key, value in m.items()}
+            del R
+        r = pearson(summed if summed is not None else moments(np.empty((0, n_cols))))
+
+        for j in range(n_cols):
+            if present[:, j].all():
+                continue
+            for i in range(n_cols):
+                if i == j:
+                    continue
+                both = present[:, i] & present[:, j]
+                pair = np.column_stack([ranks_within(i, both), ranks_within(j, both)])
+                r[i, j] = r[j, i] = pearson(moments(pair))[0, 1]
+
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
@@ -0,0 +1,116 @@
+from math import prod
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import query
+import tracing
+
+
+# Low-cardinality columns the Analysis Questions page groups or filters by
+DIMENSIONS = [
+    'neighbourhood_group',
+    'room_type',
+    'year',
+    'cancellation_policy',
+    'instant_bookable',
+]
+
+MEASURES = [
+    'price',
+    'minimum_nights',
+    'review_rate_number',
+    'number_of_reviews',
+    'reviews_per_month',
+    'availability_365',
+]
+
+
+def cell_mask(cells, selections=None, exclude=None):
+    # Which cells (rows of a frame keyed by dimension values) a filter keeps
+    mask = np.ones(len(cells), dtype=bool)
+    for col, selected in (selections or {}).items():
+        if col in cells.columns:
+            mask &= cells[col].isin(list(selected)).to_numpy()
+    for col, excluded in (exclude or {}).items():
+        mask &= ~cells[col].isin(list(excluded)).to_numpy()
+    return mask
+
+
+def dimension_values(df, dimensions):
+    # Sorted distinct values of each dimension, the levels combination codes are built from
+    return {col: sorted(query.value_counts(df, col).index.tolist()) for col in dimensions}
+
+
+def combination_codes(frame, values):
+    # Mixed-radix code of each row's dimension values, with one extra slot
+    # per dimension for missing values; stable across chunks of a frame
+    codes = np.zeros(len(frame), dtype=np.int64)
+    for col, levels in values.items():
+        radix = len(levels) + 1
+        level = pd.Index(levels).get_indexer(np.asarray(frame[col], dtype=object))
+        codes = codes * radix + np.where(level < 0, radix - 1, level)
+    return codes
+
+
+def combinations(values, codes=None):
+    # Dimension values of each combination code (every code when None), as a frame
+    codes = np.arange(prod(len(levels) + 1 for levels in values.values())) if codes is None else np.asarray(codes)
+    columns = {}
+    for col, levels in reversed(list(values.items())):
+        radix = len(levels) + 1
+        columns[col] = np.array(levels + [np.nan], dtype=object)[codes % radix]
+        codes = codes // radix
+    return pd.DataFrame({col: columns[col] for col in values}, index=pd.RangeIndex(len(codes))).infer_objects()
+
+
+class Cube:
+    # Sum / count / sum of squares per measure for every observed combination
+    # of the dimensions, computed once at load time. Any groupby over a subset
+    # of the dimensions under any filter on them is answered by rolling up the
+    # matching cells, so the cost depends on the number of cells, not rows.
+
+    def __init__(self, df, dimensions=DIMENSIONS, measures=MEASURES):
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        self.measures = [m for m in measures if m in df.columns]
+
+        # Chunked bincount kernels when the data does not fit in memory
+        cells = query.group_stats(df, self.dimensions, self.measures, dropna=False)
+        self.value_columns = [col for col in cells.columns if col not in self.dimensions]
+        self.cells = data_store.plain(cells)
+
+    def matching(self, selections=None, exclude=None):
+        return self.cells[cell_mask(self.cells, selections, exclude)]
+
+    def rollup(self, by, measures, selections=None, exclude=None, stat='mean'):
+        # Equivalent to df_filtered.groupby(by)[measures].<stat>() with
+        # df_filtered restricted by selections / exclude
+        if isinstance(by, str):
+            by = [by]
+        if isinstance(measures, str):
+            measures = [measures]
+
+        with tracing.span('rollup', 'aggregate', by=by, measures=measures) as sp:
+            cells = self.matching(selections, exclude)
+            sp.set(rows=len(cells))
+            sums = cells.groupby(by, sort=True)[self.value_columns].sum()
+
+        out = pd.DataFrame(index=sums.index)
+        for m in measures:
+            if m == 'n_rows':
+                out[m] = sums['n_rows']
+                continue
+            s, n, sq = sums[f'{m}_sum'], sums[f'{m}_count'], sums[f'{m}_sumsq']
+            if stat == 'mean':
+                out[m] = (s / n).where(n > 0)
+            elif stat == 'sum':
+                out[m] = s
+            elif stat == 'count':
+                out[m] = n
+            elif stat == 'std':
+                var = (sq - s * s / n) / (n - 1)
+                out[m] = np.sqrt(var.clip(lower=0)).where(n > 1)
+            else:
+                raise ValueError(f'Unknown stat: {stat}')
+        return out
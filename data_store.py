@@ -0,0 +1,381 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+CSV_PATH = 'Airbnb_Cleaned.csv'
+
+# Bump whenever the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 2
+
+# Text columns holding dates; parsed once at conversion time
+DATE_COLUMNS = ['last_review', 'last_review_date']
+
+# Rows parsed per CSV chunk while building the cache
+BUILD_CHUNK_ROWS = 1_000_000
+
+
+# -----------------------
+# Source fingerprint
+# -----------------------
+def cache_dir_for(csv_path):
+    return os.path.splitext(csv_path)[0] + '.cache'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(csv_path),
+    }
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(cache_dir, meta):
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def cache_is_fresh(csv_path, cache_dir):
+    meta = read_meta(cache_dir)
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = os.stat(csv_path)
+    source = meta['source']
+    if source['size'] != stat.st_size:
+        return False
+    if source['mtime_ns'] == stat.st_mtime_ns:
+        return True
+
+    # Same size but touched: only rebuild if the content actually changed
+    if file_sha256(csv_path) != source['sha256']:
+        return False
+    source['mtime_ns'] = stat.st_mtime_ns
+    write_meta(cache_dir, meta)
+    return True
+
+
+# -----------------------
+# Conversion
+# -----------------------
+class MixedColumnError(ValueError):
+    # A column that parsed as numbers in some chunks and as text in others
+
+    def __init__(self, name, old_kind, new_kind):
+        super().__init__(f'Column {name!r} changes type from {old_kind} to {new_kind} part way through the CSV')
+        self.name = name
+
+
+class ColumnEncoder:
+    # Streams one CSV column, chunk by chunk, into a raw temp file and then
+    # into its final typed .npy. Only the current chunk (and, for text
+    # columns, the dictionary of distinct values) is held in memory.
+    # Kinds: 'int' / 'float' / 'bool' (raw int8, -1 missing) / 'datetime' /
+    # 'category' (raw int32 codes, -1 missing).
+
+    RAW_DTYPES = {'int': np.int64, 'float': np.float64, 'bool': np.int8,
+                  'datetime': np.int64, 'category': np.int32}
+
+    def __init__(self, name, raw_path):
+        self.name = name
+        self.raw_path = raw_path
+        self.kind = None
+        self.rows = 0
+        self.non_null = 0
+        self.lo = None
+        self.hi = None
+        self.lookup = {}
+        self.bools_seen = set()
+        self.has_missing = False
+
+    @staticmethod
+    def chunk_kind(name, series):
+        if name in DATE_COLUMNS:
+            return 'datetime'
+        if pd.api.types.is_bool_dtype(series):
+            return 'bool'
+        if pd.api.types.is_integer_dtype(series):
+            return 'int'
+        if pd.api.types.is_float_dtype(series):
+            return 'float'
+        # True/False with blanks parses as object holding Python bools
+        if pd.api.types.infer_dtype(series, skipna=True) == 'boolean':
+            return 'bool'
+        return 'category'
+
+    def reencode(self, kind):
+        # Rewrites what has been streamed so far under a new kind: either
+        # widening int to float, or replacing an all-missing prefix
+        old = np.memmap(self.raw_path, dtype=self.RAW_DTYPES[self.kind], mode='r') if self.rows else np.empty(0)
+        new_path = self.raw_path + '.new'
+        with open(new_path, 'wb') as f:
+            for start in range(0, self.rows, BUILD_CHUNK_ROWS):
+                part = np.asarray(old[start:start + BUILD_CHUNK_ROWS])
+                if self.non_null:
+                    part = part.astype(np.float64)
+                else:
+                    part = self.missing(kind, len(part))
+                part.tofile(f)
+        del old
+        os.replace(new_path, self.raw_path)
+        self.kind = kind
+
+    @staticmethod
+    def missing(kind, n):
+        if kind == 'float':
+            return np.full(n, np.nan)
+        if kind == 'datetime':
+            return np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        return np.full(n, -1, dtype=ColumnEncoder.RAW_DTYPES[kind])
+
+    def append(self, series):
+        kind = self.chunk_kind(self.name, series)
+        non_null = int(series.notna().sum())
+        if self.kind is None:
+            self.kind = kind
+        elif kind != self.kind:
+            if non_null == 0:
+                # An all-missing chunk parses as float; keep the column's kind,
+                # except that integers with gaps become floats, as in pandas
+                if self.kind == 'int':
+                    self.reencode('float')
+                kind = self.kind
+            elif self.non_null == 0:
+                # Everything so far was missing, so integers arrive with gaps
+                if kind != 'int':
+                    self.reencode(kind)
+                kind = self.kind
+            elif {self.kind, kind} == {'int', 'float'}:
+                if self.kind == 'int':
+                    self.reencode('float')
+                kind = 'float'
+            else:
+                raise MixedColumnError(self.name, self.kind, kind)
+
+        if non_null == 0 and kind == 'bool':
+            raw = self.missing(kind, len(series))
+        elif kind == 'int':
+            raw = series.to_numpy(dtype=np.int64)
+        elif kind == 'float':
+            raw = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        elif kind == 'bool':
+            raw = series.map({True: 1, False: 0}).fillna(-1).to_numpy(dtype=np.int8)
+            self.bools_seen.update(bool(v) for v in np.unique(raw[raw >= 0]))
+        elif kind == 'datetime':
+            raw = pd.to_datetime(series, errors='coerce').to_numpy('datetime64[ns]').view(np.int64)
+        else:
+            codes, uniques = pd.factorize(series)
+            remap = np.array([self.lookup.setdefault(v, len(self.lookup)) for v in uniques] + [-1], dtype=np.int32)
+            raw = remap[codes]
+
+        if kind in ('int', 'float') and non_null:
+            values = raw[~np.isnan(raw)] if kind == 'float' else raw
+            self.lo = values.min() if self.lo is None else min(self.lo, values.min())
+            self.hi = values.max() if self.hi is None else max(self.hi, values.max())
+        self.has_missing = self.has_missing or non_null < len(series)
+        self.non_null += non_null
+        self.rows += len(series)
+        with open(self.raw_path, 'ab') as f:
+            raw.tofile(f)
+
+    def final_dtype(self):
+        if self.kind == 'int':
+            # Smallest signed integer type that holds the range, like pd.to_numeric(downcast='integer')
+            for dtype in (np.int8, np.int16, np.int32, np.int64):
+                info = np.iinfo(dtype)
+                if self.lo is None or (info.min <= self.lo and self.hi <= info.max):
+                    return dtype
+        if self.kind == 'float':
+            # Floats stay float64: pandas accumulates means in the storage dtype,
+            # so float32 would change the aggregates the app displays
+            return np.float64
+        if self.kind == 'bool':
+            return category_code_dtype(len(self.bools_seen)) if self.has_missing else np.bool_
+        if self.kind == 'datetime':
+            return np.dtype('datetime64[ns]')
+        return category_code_dtype(len(self.lookup))
+
+    def finish(self, npy_path, chunk_rows):
+        raw = np.memmap(self.raw_path, dtype=self.RAW_DTYPES[self.kind], mode='r') if self.rows else np.empty(0)
+        categories = None
+        remap = None
+
+        if self.kind == 'category':
+            values = list(self.lookup)
+            try:
+                categories = sorted(values)
+            except TypeError:
+                categories = values
+            position = {v: i for i, v in enumerate(categories)}
+            remap = np.array([position[v] for v in values] + [-1], dtype=np.int64)
+        elif self.kind == 'bool' and self.has_missing:
+            # Blank-able booleans load as a category of the values seen, as pd.Categorical would make them
+            categories = sorted(self.bools_seen)
+            position = {v: i for i, v in enumerate(categories)}
+            remap = np.array([position.get(False, -1), position.get(True, -1), -1], dtype=np.int64)
+
+        out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=self.final_dtype(), shape=(self.rows,))
+        for start in range(0, self.rows, chunk_rows):
+            part = np.asarray(raw[start:start + chunk_rows])
+            if remap is not None:
+                part = remap[part]
+            elif self.kind == 'datetime':
+                part = part.view('datetime64[ns]')
+            out[start:start + chunk_rows] = part
+        out.flush()
+        del out, raw
+        os.remove(self.raw_path)
+
+        kind = 'category' if categories is not None else ('datetime' if self.kind == 'datetime' else 'numeric')
+        return kind, categories
+
+
+def category_code_dtype(n_categories):
+    # Same code widths pandas picks for a Categorical
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def encode_csv(csv_path, tmp_dir, chunk_rows, text_columns=()):
+    # Streams every column of the CSV into its encoder; text_columns are
+    # read as strings whatever they look like
+    encoders = []
+    dtype = {name: str for name in text_columns} or None
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=dtype):
+        if not encoders:
+            encoders = [ColumnEncoder(name, os.path.join(tmp_dir, f'{i:03d}.raw'))
+                        for i, name in enumerate(chunk.columns)]
+        for encoder, name in zip(encoders, chunk.columns):
+            encoder.append(chunk[name])
+    return encoders
+
+
+def build_cache(csv_path, cache_dir=None, chunk_rows=BUILD_CHUNK_ROWS):
+    # Converts the CSV chunk by chunk, so the CSV never has to fit in memory
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+    fingerprint = source_fingerprint(csv_path)
+
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    tmp_dir = tempfile.mkdtemp(prefix='.building-', dir=parent)
+    try:
+        # A column that only turns out to hold text part way through (numbers
+        # first, then words) is a category of its text, as one read_csv of
+        # the whole file makes it. The rows already streamed were parsed as
+        # numbers, so the conversion starts over with that column read as
+        # strings; this only happens for files that have such a column.
+        text_columns = []
+        while True:
+            try:
+                encoders = encode_csv(csv_path, tmp_dir, chunk_rows, text_columns)
+                break
+            except MixedColumnError as e:
+                if e.name in text_columns:
+                    raise
+                text_columns.append(e.name)
+                for name in os.listdir(tmp_dir):
+                    os.remove(os.path.join(tmp_dir, name))
+
+        columns = []
+        for i, encoder in enumerate(encoders):
+            file_name = f'{i:03d}.npy'
+            kind, categories = encoder.finish(os.path.join(tmp_dir, file_name), chunk_rows)
+            columns.append({
+                'name': encoder.name,
+                'kind': kind,
+                'file': file_name,
+                'categories': categories,
+            })
+
+        write_meta(tmp_dir, {
+            'version': CACHE_VERSION,
+            'source': fingerprint,
+            'rows': encoders[0].rows if encoders else 0,
+            'columns': columns,
+        })
+
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return cache_dir
+
+
+# -----------------------
+# Loading
+# -----------------------
+def load_columnar(cache_dir, mmap=True):
+    meta = read_meta(cache_dir)
+    mmap_mode = 'r' if mmap else None
+
+    data = {}
+    for col in meta['columns']:
+        values = np.load(os.path.join(cache_dir, col['file']), mmap_mode=mmap_mode)
+        if col['kind'] == 'category':
+            data[col['name']] = pd.Categorical.from_codes(values, categories=col['categories'])
+        else:
+            data[col['name']] = values
+
+    # copy=False keeps one block per column so numeric columns stay backed by the map
+    return pd.DataFrame(data, copy=False)
+
+
+def ensure_cache(csv_path=CSV_PATH):
+    cache_dir = cache_dir_for(csv_path)
+    if not cache_is_fresh(csv_path, cache_dir):
+        build_cache(csv_path, cache_dir)
+    return cache_dir
+
+
+def load_dataset(csv_path=CSV_PATH, mmap=True):
+    return load_columnar(ensure_cache(csv_path), mmap=mmap)
+
+
+def plain(frame):
+    # Plotly express groups on every category of a categorical column, including
+    # the ones the current filter removed, so charts get plain object columns
+    cat_cols = frame.select_dtypes(include='category').columns
+    if len(cat_cols) == 0:
+        return frame
+    return frame.astype({col: object for col in cat_cols})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the cleaned CSV into the typed columnar cache.')
+    parser.add_argument('csv', nargs='?', default=CSV_PATH)
+    parser.add_argument('--force', action='store_true', help='rebuild even if the cache is fresh')
+    args = parser.parse_args()
+
+    cache_dir = cache_dir_for(args.csv)
+    if args.force or not cache_is_fresh(args.csv, cache_dir):
+        build_cache(args.csv, cache_dir)
+        print(f'Wrote {cache_dir}')
+    else:
+        print(f'{cache_dir} is up to date')
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+
+# Columns the sidebar can filter on; any that are missing from the data are skipped
+FILTER_COLUMNS = [
+    'room_type',
+    'neighbourhood_group',
+    'cancellation_policy',
+    'instant_bookable',
+    'host_identity_verified',
+    'year',
+]
+
+
+class FilterIndex:
+    # Packed per-value bitmaps over the shared frame, built once at load time.
+    # A selection is answered with bitmap OR (within a column) and AND (across
+    # columns) instead of isin() scans over string columns.
+
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.n_rows = len(df)
+        self.options = {}
+        self.bitmaps = {}
+        self.missing = {}
+
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, values = self.factorize(df[col])
+
+            # Widget options keep the order of first appearance, like Series.unique()
+            seen = pd.unique(codes[codes >= 0])
+            options = [values[code] for code in seen]
+            if (codes < 0).any():
+                options.append(np.nan)
+                self.missing[col] = np.packbits(codes < 0)
+            self.options[col] = options
+            self.bitmaps[col] = {values[code]: np.packbits(codes == code) for code in seen}
+
+    @staticmethod
+    def factorize(series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return np.asarray(series.cat.codes), series.cat.categories.tolist()
+        codes, uniques = pd.factorize(series, sort=True)
+        return codes, uniques.tolist()
+
+    def covers_all(self, col, selected):
+        selected = list(selected)
+        has_missing = any(pd.isna(v) for v in selected)
+        if col in self.missing and not has_missing:
+            return False
+        return set(self.bitmaps[col]).issubset(v for v in selected if not pd.isna(v))
+
+    def column_bitmap(self, col, selected):
+        bitmap = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for value in selected:
+            if pd.isna(value):
+                part = self.missing.get(col)
+            else:
+                part = self.bitmaps[col].get(value)
+            if part is not None:
+                np.bitwise_or(bitmap, part, out=bitmap)
+        return bitmap
+
+    def select(self, selections):
+        # selections maps column -> selected values. Returns the sorted row
+        # positions that match, or None when the selection covers every row.
+        combined = None
+        for col, selected in selections.items():
+            if col not in self.bitmaps or self.covers_all(col, selected):
+                continue
+            bitmap = self.column_bitmap(col, selected)
+            if combined is None:
+                combined = bitmap
+            else:
+                np.bitwise_and(combined, bitmap, out=combined)
+
+        if combined is None:
+            return None
+        return np.flatnonzero(np.unpackbits(combined, count=self.n_rows))
+
+
+def apply_rows(df, rows):
+    # No copy at all when the selection covers everything
+    if rows is None:
+        return df
+    return df.take(rows)
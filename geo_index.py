@@ -0,0 +1,309 @@
+import numpy as np
+import pandas as pd
+
+import cube
+import query
+
+
+# Depth of the per-listing keys: cells 2^-31 of the world across, about 2 cm
+MAX_LEVEL = 31
+
+# Mapbox GL draws the world TILE_SIZE px across at zoom 0, doubling per zoom level
+TILE_SIZE = 512
+
+# A zoom level is served from the grid CELL_BITS levels below it, so
+# aggregate cells are TILE_SIZE / 2**CELL_BITS = 32 px across on screen
+CELL_BITS = 4
+
+MIN_ZOOM = 3
+MAX_ZOOM = 18
+# From this zoom on, individual listings are returned instead of cells
+POINT_ZOOM = 14
+
+# Map size in pixels that viewport queries cover around the centre
+MAP_WIDTH = 1400
+MAP_HEIGHT = 650
+
+# Columns a listing is placed by; the map needs both
+LOCATION_COLUMNS = ['latitude', 'longitude']
+
+# Sidebar filter columns the index answers, and the measures averaged per cell
+DIMENSIONS = ['room_type', 'neighbourhood_group']
+MEASURES = ['price', 'reviews_per_month']
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.05112878
+
+# Bit masks for interleaving two 32-bit integers into one 64-bit Morton key
+SPREAD = [
+    (np.uint64(16), np.uint64(0x0000FFFF0000FFFF)),
+    (np.uint64(8), np.uint64(0x00FF00FF00FF00FF)),
+    (np.uint64(4), np.uint64(0x0F0F0F0F0F0F0F0F)),
+    (np.uint64(2), np.uint64(0x3333333333333333)),
+    (np.uint64(1), np.uint64(0x5555555555555555)),
+]
+COMPACT = [
+    (np.uint64(1), np.uint64(0x3333333333333333)),
+    (np.uint64(2), np.uint64(0x0F0F0F0F0F0F0F0F)),
+    (np.uint64(4), np.uint64(0x00FF00FF00FF00FF)),
+    (np.uint64(8), np.uint64(0x0000FFFF0000FFFF)),
+    (np.uint64(16), np.uint64(0x00000000FFFFFFFF)),
+]
+
+
+# -----------------------
+# Projection and keys
+# -----------------------
+def project(lat, lon):
+    # Web Mercator, as fractions of the world: x runs east, y south, both in [0, 1)
+    lat = np.radians(np.clip(np.asarray(lat, dtype='float64'), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon, dtype='float64') + 180) / 360
+    y = 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+    return x, y
+
+
+def unproject(x, y):
+    lat = np.degrees(2 * np.arctan(np.exp((0.5 - np.asarray(y)) * 2 * np.pi)) - np.pi / 2)
+    lon = np.asarray(x) * 360 - 180
+    return lat, lon
+
+
+def grid(x, y, level):
+    # Integer cell coordinates at a quadtree level
+    side = 1 << level
+    ix = np.clip(np.floor(np.asarray(x) * side), 0, side - 1).astype(np.uint64)
+    iy = np.clip(np.floor(np.asarray(y) * side), 0, side - 1).astype(np.uint64)
+    return ix, iy
+
+
+def interleave(ix, iy):
+    # Morton (Z-order) key: the bits of x and y alternate, so every quadtree
+    # cell at any level is one contiguous range of keys
+    def spread(v):
+        v = np.asarray(v, dtype=np.uint64)
+        for shift, mask in SPREAD:
+            v = (v | (v << shift)) & mask
+        return v
+    return spread(ix) | (spread(iy) << np.uint64(1))
+
+
+def deinterleave(keys):
+    def compact(v):
+        v = v & SPREAD[-1][1]
+        for shift, mask in COMPACT:
+            v = (v | (v >> shift)) & mask
+        return v
+    keys = np.asarray(keys, dtype=np.uint64)
+    return compact(keys), compact(keys >> np.uint64(1))
+
+
+def level_for(zoom):
+    # Grid level whose cells are a fixed number of pixels across at this zoom
+    return min(zoom + CELL_BITS, MAX_LEVEL)
+
+
+def viewport(lat, lon, zoom, width=MAP_WIDTH, height=MAP_HEIGHT):
+    # World-fraction bounds (x0, y0, x1, y1) of a map view at this centre and zoom
+    x, y = project(lat, lon)
+    world = TILE_SIZE * 2.0 ** zoom
+    half_w, half_h = width / 2 / world, height / 2 / world
+    edge = np.nextafter(1.0, 0.0)
+    return (max(float(x) - half_w, 0.0), max(float(y) - half_h, 0.0),
+            min(float(x) + half_w, edge), min(float(y) + half_h, edge))
+
+
+def cells_in_view(bounds, level):
+    # Morton keys of every cell of the level's grid that the bounds touch
+    x0, y0, x1, y1 = bounds
+    (ix0, ix1), (iy0, iy1) = grid([x0, x1], [y0, y1], level)
+    ix, iy = np.meshgrid(np.arange(ix0, ix1 + 1, dtype=np.uint64), np.arange(iy0, iy1 + 1, dtype=np.uint64))
+    return np.sort(interleave(ix.ravel(), iy.ravel()))
+
+
+def ranges(lo, hi):
+    # Concatenated np.arange(lo[i], hi[i]) for every i
+    lengths = hi - lo
+    keep = lengths > 0
+    lo, lengths = lo[keep], lengths[keep]
+    starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+    return starts + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def key_sums(keys, columns):
+    # Sorted distinct keys and the sum of each column per key
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, {name: np.bincount(inverse, weights=v, minlength=len(uniq)) for name, v in columns.items()}
+
+
+# -----------------------
+# Index
+# -----------------------
+class GeoIndex:
+    # Listings on a quadtree over Web Mercator, built once at load time over
+    # the full frame. Sorted by Morton key, the listings of any quadtree cell
+    # are one contiguous run, found by binary search. Per-level cell tables
+    # hold the listing count and measure sums per (cell, filter combination),
+    # so a viewport query touches only the cells in view: its cost depends on
+    # the map size and the listings actually drawn, not on the dataset size.
+
+    def __init__(self, df, dimensions=DIMENSIONS, measures=MEASURES):
+        missing = [col for col in LOCATION_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"No {' or '.join(missing)} column to place the listings by")
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        self.measures = [m for m in measures if m in df.columns]
+
+        # Filter combinations are mixed-radix codes over the dimension values
+        self.values = cube.dimension_values(df, self.dimensions)
+        self.combos = cube.combinations(self.values)
+        self.n_combos = len(self.combos)
+
+        self.min_level = level_for(MIN_ZOOM)
+        self.max_cell_level = level_for(POINT_ZOOM - 1)
+        cell_shift = np.uint64(2 * (MAX_LEVEL - self.max_cell_level))
+
+        cells = []
+        for frame in query.chunks(df, LOCATION_COLUMNS + self.dimensions + self.measures):
+            located, key, combo = self.locate(frame)
+
+            # Finest cell level, summed per chunk so measures are never kept per row
+            stats = {'listings': np.ones(len(key))}
+            for m in self.measures:
+                values = frame[m].to_numpy(dtype='float64', na_value=np.nan)[located]
+                present = ~np.isnan(values)
+                stats[f'{m}_sum'] = np.where(present, values, 0.0)
+                stats[f'{m}_count'] = present.astype('float64')
+            cell_keys = (key >> cell_shift).astype(np.int64) * self.n_combos + combo
+            cells.append(key_sums(cell_keys, stats))
+
+        # Per-listing keys for the point queries. On a query.View they are
+        # written next to the column cache and memory-mapped, so they cost
+        # page cache rather than process memory and outlive restarts.
+        if isinstance(df, query.View) and df.rows is None:
+            points = df.store.derived('-'.join(['geo'] + self.dimensions), lambda: self.build_points(df))
+        else:
+            points = self.build_points(df)
+        self.point_keys, self.point_combos, self.point_rows = points['keys'], points['combos'], points['rows']
+
+        # Cell tables from the finest level up, each rolled up from the one below
+        names = ['listings'] + [f'{m}_{s}' for m in self.measures for s in ('sum', 'count')]
+        level_keys = np.concatenate([c[0] for c in cells]) if cells else np.empty(0, dtype=np.int64)
+        level_stats = {name: np.concatenate([c[1][name] for c in cells]) if cells else np.empty(0) for name in names}
+        self.tables = {}
+        for level in range(self.max_cell_level, self.min_level - 1, -1):
+            level_keys, level_stats = key_sums(level_keys, level_stats)
+            self.tables[level] = (level_keys, level_stats)
+            level_keys = ((level_keys // self.n_combos) >> 2) * self.n_combos + level_keys % self.n_combos
+
+        self.extent = self.combo_extent()
+
+    def locate(self, frame):
+        # Which rows of a chunk have coordinates, and their Morton keys and filter combinations
+        lat = frame['latitude'].to_numpy(dtype='float64', na_value=np.nan)
+        lon = frame['longitude'].to_numpy(dtype='float64', na_value=np.nan)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        key = interleave(*grid(*project(lat[located], lon[located]), MAX_LEVEL))
+        combo = cube.combination_codes(frame, self.values)[located]
+        return located, key, combo
+
+    def build_points(self, df):
+        # Every located listing's key, filter combination and row position, in key order
+        keys, combo_codes, rows = [], [], []
+        start = 0
+        for frame in query.chunks(df, LOCATION_COLUMNS + self.dimensions):
+            located, key, combo = self.locate(frame)
+            keys.append(key)
+            combo_codes.append(combo)
+            rows.append(start + np.flatnonzero(located))
+            start += len(frame)
+
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        combo_dtype = np.int16 if self.n_combos < np.iinfo(np.int16).max else np.int64
+        row_dtype = np.int32 if start < np.iinfo(np.int32).max else np.int64
+        return {
+            'keys': keys[order],
+            'combos': np.concatenate(combo_codes or [np.empty(0, np.int64)])[order].astype(combo_dtype),
+            'rows': np.concatenate(rows or [np.empty(0, np.int64)])[order].astype(row_dtype),
+        }
+
+    def combo_extent(self):
+        # Listing-weighted centre and bounding box of each filter combination,
+        # at the finest cell level; used to frame a selection on the map
+        keys, stats = self.tables[self.max_cell_level]
+        side = 1 << self.max_cell_level
+        ix, iy = deinterleave((keys // self.n_combos).astype(np.uint64))
+        cells = pd.DataFrame({
+            'combo': keys % self.n_combos,
+            'listings': stats['listings'],
+            'x': (ix + 0.5) / side,
+            'y': (iy + 0.5) / side,
+        })
+        cells['x_sum'] = cells['x'] * cells['listings']
+        cells['y_sum'] = cells['y'] * cells['listings']
+        extent = cells.groupby('combo').agg(
+            listings=('listings', 'sum'), x_sum=('x_sum', 'sum'), y_sum=('y_sum', 'sum'),
+            x_min=('x', 'min'), x_max=('x', 'max'), y_min=('y', 'min'), y_max=('y', 'max'),
+        )
+        return extent.reindex(pd.RangeIndex(self.n_combos))
+
+    def allowed(self, selections=None):
+        # Which filter combinations the sidebar selection keeps
+        return cube.cell_mask(self.combos, selections)
+
+    def fit(self, selections=None, width=MAP_WIDTH, height=MAP_HEIGHT):
+        # Centre (lat, lon) and the closest zoom that frames every matching
+        # listing, or None when nothing matches
+        extent = self.extent[self.allowed(selections)].dropna()
+        n = extent['listings'].sum()
+        if n == 0:
+            return None
+        lat, lon = unproject(extent['x_sum'].sum() / n, extent['y_sum'].sum() / n)
+        dx = max(extent['x_max'].max() - extent['x_min'].min(), 1.0 / TILE_SIZE / 2 ** MAX_ZOOM)
+        dy = max(extent['y_max'].max() - extent['y_min'].min(), 1.0 / TILE_SIZE / 2 ** MAX_ZOOM)
+        zoom = int(np.floor(np.log2(min(width / dx, height / dy) / TILE_SIZE)))
+        return float(lat), float(lon), int(np.clip(zoom, MIN_ZOOM, POINT_ZOOM - 1))
+
+    def cells(self, bounds, zoom, selections=None):
+        # Listing count and mean measures per grid cell in view, for the grid
+        # of this zoom; cells are placed at their centres
+        level = min(max(level_for(zoom), self.min_level), self.max_cell_level)
+        keys, stats = self.tables[level]
+        prefixes = cells_in_view(bounds, level).astype(np.int64)
+        idx = ranges(np.searchsorted(keys, prefixes * self.n_combos),
+                     np.searchsorted(keys, (prefixes + 1) * self.n_combos))
+        idx = idx[self.allowed(selections)[keys[idx] % self.n_combos]]
+
+        cell_keys, sums = key_sums(keys[idx] // self.n_combos, {name: v[idx] for name, v in stats.items()})
+        side = 1 << level
+        ix, iy = deinterleave(cell_keys.astype(np.uint64))
+        lat, lon = unproject((ix + 0.5) / side, (iy + 0.5) / side)
+        out = pd.DataFrame({'latitude': lat, 'longitude': lon, 'listings': sums['listings'].astype('int64')})
+        for m in self.measures:
+            count = sums[f'{m}_count']
+            out[m] = np.where(count > 0, sums[f'{m}_sum'] / np.maximum(count, 1), np.nan)
+        return out
+
+    def points(self, bounds, zoom, selections=None, max_points=None):
+        # Row positions of the matching listings inside the bounds, and how
+        # many there are. Beyond max_points an evenly spaced subset along the
+        # key order is returned, which spreads it over the whole view.
+        level = level_for(zoom)
+        shift = np.uint64(2 * (MAX_LEVEL - level))
+        prefixes = cells_in_view(bounds, level)
+        idx = ranges(np.searchsorted(self.point_keys, prefixes << shift),
+                     np.searchsorted(self.point_keys, (prefixes + np.uint64(1)) << shift))
+
+        # Cells on the edge of the view stick out of it
+        x0, y0, x1, y1 = bounds
+        side = float(1 << MAX_LEVEL)
+        ix, iy = deinterleave(self.point_keys[idx])
+        x, y = (ix + 0.5) / side, (iy + 0.5) / side
+        keep = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        keep &= self.allowed(selections)[self.point_combos[idx]]
+        idx = idx[keep]
+
+        total = len(idx)
+        if max_points is not None and total > max_points:
+            idx = idx[np.linspace(0, total - 1, max_points).astype(np.int64)]
+        return np.sort(self.point_rows[idx]), total
@@ -0,0 +1,177 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+HIST_BINS = 20
+TOP_K = 5
+
+
+def column_kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return 'categorical'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    return 'categorical'
+
+
+def profile_numeric(df, cols, ranges=None, bins=HIST_BINS):
+    # All numeric columns as one (rows x cols) float block: every statistic,
+    # including the histograms, is a single vectorised reduction over it
+    if not cols:
+        return {}
+    X = np.column_stack([df[col].to_numpy(dtype='float64', na_value=np.nan) for col in cols])
+    valid = ~np.isnan(X)
+    count = valid.sum(axis=0)
+    filled = np.where(valid, X, 0.0)
+
+    mins = np.where(count > 0, np.where(valid, X, np.inf).min(axis=0, initial=np.inf), np.nan)
+    maxs = np.where(count > 0, np.where(valid, X, -np.inf).max(axis=0, initial=-np.inf), np.nan)
+    sums = filled.sum(axis=0)
+    sumsq = (filled * filled).sum(axis=0)
+    if len(X):
+        # All-NaN columns just get NaN quantiles
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            quantiles = np.nanquantile(X, QUANTILES, axis=0)
+    else:
+        quantiles = np.full((len(QUANTILES), len(cols)), np.nan)
+
+    # Histogram edges: caller-supplied ranges (needed to merge chunks) or the data's own
+    lo = np.array([ranges[c][0] if ranges and c in ranges else mins[i] for i, c in enumerate(cols)])
+    hi = np.array([ranges[c][1] if ranges and c in ranges else maxs[i] for i, c in enumerate(cols)])
+    lo = np.nan_to_num(lo)
+    hi = np.where(np.nan_to_num(hi) > lo, np.nan_to_num(hi), lo + 1)
+    with np.errstate(invalid='ignore'):
+        bin_ids = np.floor((X - lo) / (hi - lo) * bins)
+    bin_ids = np.clip(np.nan_to_num(bin_ids), 0, bins - 1).astype(np.int64)
+    flat = (bin_ids + np.arange(len(cols)) * bins)[valid]
+    hists = np.bincount(flat, minlength=bins * len(cols)).reshape(len(cols), bins)
+
+    out = {}
+    for i, col in enumerate(cols):
+        out[col] = {
+            'kind': 'numeric',
+            'dtype': str(df[col].dtype),
+            'count': int(count[i]),
+            'null': int(len(X) - count[i]),
+            'min': mins[i],
+            'max': maxs[i],
+            'sum': sums[i],
+            'sumsq': sumsq[i],
+            'quantiles': dict(zip(QUANTILES, quantiles[:, i])),
+            'hist': hists[i],
+            'edges': np.linspace(lo[i], hi[i], bins + 1),
+        }
+    return out
+
+
+def profile_categorical(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = np.asarray(series.cat.codes).astype(np.int64)
+        categories = series.cat.categories
+    else:
+        codes, categories = pd.factorize(series)
+    counts = np.bincount(codes + 1, minlength=len(categories) + 1)
+    nonzero = np.flatnonzero(counts[1:])
+    return {
+        'kind': 'categorical',
+        'dtype': str(series.dtype),
+        'count': int(len(codes) - counts[0]),
+        'null': int(counts[0]),
+        'counts': dict(zip(categories[nonzero].tolist(), counts[1:][nonzero].tolist())),
+    }
+
+
+def profile_datetime(series):
+    values = series.to_numpy()
+    valid = ~np.isnat(values)
+    return {
+        'kind': 'datetime',
+        'dtype': str(series.dtype),
+        'count': int(valid.sum()),
+        'null': int(len(values) - valid.sum()),
+        'min': pd.Timestamp(values[valid].min()) if valid.any() else None,
+        'max': pd.Timestamp(values[valid].max()) if valid.any() else None,
+    }
+
+
+def profile_frame(df, ranges=None, bins=HIST_BINS):
+    # Profile of every column; ranges fixes histogram edges so chunk profiles can be merged
+    kinds = {col: column_kind(df[col]) for col in df.columns}
+    numeric = profile_numeric(df, [c for c, k in kinds.items() if k == 'numeric'], ranges, bins)
+
+    profile = {}
+    for col, kind in kinds.items():
+        if kind == 'numeric':
+            profile[col] = numeric[col]
+        elif kind == 'datetime':
+            profile[col] = profile_datetime(df[col])
+        else:
+            profile[col] = profile_categorical(df[col])
+    return profile
+
+
+def merge_profiles(a, b):
+    # Exact for counts, extremes, sums and category counts. Histograms must
+    # share edges; merged quantiles are estimated from the merged histogram.
+    merged = {}
+    for col, pa in a.items():
+        pb = b[col]
+        p = {'kind': pa['kind'], 'dtype': pa['dtype'],
+             'count': pa['count'] + pb['count'], 'null': pa['null'] + pb['null']}
+
+        if pa['kind'] == 'numeric':
+            if not np.allclose(pa['edges'], pb['edges']):
+                raise ValueError(f'Histogram edges differ for {col}; profile chunks with the same ranges')
+            p['min'] = np.fmin(pa['min'], pb['min'])
+            p['max'] = np.fmax(pa['max'], pb['max'])
+            p['sum'] = pa['sum'] + pb['sum']
+            p['sumsq'] = pa['sumsq'] + pb['sumsq']
+            p['hist'] = pa['hist'] + pb['hist']
+            p['edges'] = pa['edges']
+            p['quantiles'] = hist_quantiles(p['hist'], p['edges'], p['min'], p['max'])
+        elif pa['kind'] == 'datetime':
+            p['min'] = min(v for v in [pa['min'], pb['min']] if v is not None) if p['count'] else None
+            p['max'] = max(v for v in [pa['max'], pb['max']] if v is not None) if p['count'] else None
+        else:
+            counts = dict(pa['counts'])
+            for value, n in pb['counts'].items():
+                counts[value] = counts.get(value, 0) + n
+            p['counts'] = counts
+        merged[col] = p
+    return merged
+
+
+def hist_quantiles(hist, edges, lo, hi):
+    total = hist.sum()
+    if total == 0:
+        return {q: np.nan for q in QUANTILES}
+    cum = np.concatenate([[0], np.cumsum(hist)]) / total
+    estimates = np.interp(QUANTILES, cum, edges)
+    return dict(zip(QUANTILES, np.clip(estimates, lo, hi)))
+
+
+def profile_chunks(chunks, ranges=None, bins=HIST_BINS):
+    # Incremental profile over an iterable of frames, e.g. pd.read_csv(..., chunksize=...)
+    profile = None
+    for chunk in chunks:
+        part = profile_frame(chunk, ranges, bins)
+        profile = part if profile is None else merge_profiles(profile, part)
+    return profile
+
+
+def mean(p):
+    return p['sum'] / p['count'] if p['count'] else np.nan
+
+
+def nunique(p):
+    return len(p['counts'])
+
+
+def top_values(p, k=TOP_K):
+    return sorted(p['counts'].items(), key=lambda item: -item[1])[:k]
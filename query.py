@@ -0,0 +1,392 @@
+import os
+import shutil
+import threading
+from math import prod
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import profiler
+import tracing
+
+
+# Rows read from the column files per kernel step
+CHUNK_ROWS = 1_000_000
+
+# Projections up to this many bytes are materialised and handed to pandas, so
+# charts on data that fits are exactly what they always were. Anything larger
+# goes through the chunked kernels, which keep one chunk in memory at a time.
+MEMORY_BUDGET = 256 << 20
+
+# Group keys up to this many combinations are accumulated in dense bincount
+# arrays; beyond that each chunk is compacted with np.unique first
+DENSE_KEYS = 1 << 20
+
+
+# -----------------------
+# Column store
+# -----------------------
+class ColumnStore:
+    # Read-only handle on a data_store cache directory: one memory-mapped
+    # array per column. Nothing is read until a query touches a column, and
+    # the kernels below only ever touch the columns they are asked about.
+
+    def __init__(self, cache_dir, chunk_rows=CHUNK_ROWS):
+        meta = data_store.read_meta(cache_dir)
+        self.cache_dir = cache_dir
+        self.chunk_rows = chunk_rows
+        self.n_rows = meta['rows']
+        self.columns = [col['name'] for col in meta['columns']]
+        self.meta = {col['name']: col for col in meta['columns']}
+        self.arrays = {
+            col['name']: np.load(os.path.join(cache_dir, col['file']), mmap_mode='r')
+            for col in meta['columns']
+        }
+        self.level_cache = {}
+        # Zero-row frame with the real dtypes, for dtype / column lookups
+        self.empty = self.frame(self.columns, np.empty(0, dtype=np.int64))
+
+    def derived(self, name, build):
+        # Arrays derived from the columns (sort orders, spatial keys), kept in
+        # <cache>/<name>/ next to them and memory-mapped like them. build()
+        # returns {array name: array} and only runs when they are missing; a
+        # changed CSV rebuilds the whole cache, so they never go stale.
+        folder = os.path.join(self.cache_dir, name)
+        if not os.path.isdir(folder):
+            # Written to a temporary folder and renamed, so readers never see half of it
+            tmp = f'{folder}.{os.getpid()}.{threading.get_ident()}.tmp'
+            os.makedirs(tmp)
+            for key, values in build().items():
+                np.save(os.path.join(tmp, f'{key}.npy'), values)
+            try:
+                os.rename(tmp, folder)
+            except OSError:
+                # Another session or process got there first
+                shutil.rmtree(tmp, ignore_errors=True)
+        return {
+            os.path.splitext(file)[0]: np.load(os.path.join(folder, file), mmap_mode='r')
+            for file in os.listdir(folder) if file.endswith('.npy')
+        }
+
+    def is_category(self, col):
+        return self.meta[col]['kind'] == 'category'
+
+    def raw(self, col, idx=None):
+        # Stored values (codes for category columns) at a slice or row positions
+        values = self.arrays[col]
+        return values if idx is None else np.asarray(values[idx])
+
+    def values(self, col, idx=None):
+        raw = self.raw(col, idx)
+        if self.is_category(col):
+            return pd.Categorical.from_codes(raw, categories=self.meta[col]['categories'])
+        return raw
+
+    def frame(self, columns, idx=None, index=None):
+        # copy=False keeps the full-length numeric columns backed by the map
+        return pd.DataFrame({col: self.values(col, idx) for col in columns}, index=index, copy=False)
+
+    def spans(self, rows=None):
+        # Slices (every row) or position arrays (a selection) of at most chunk_rows rows
+        if rows is None:
+            for start in range(0, self.n_rows, self.chunk_rows):
+                yield slice(start, min(start + self.chunk_rows, self.n_rows))
+        else:
+            for start in range(0, len(rows), self.chunk_rows):
+                yield rows[start:start + self.chunk_rows]
+
+    @staticmethod
+    def span_index(idx):
+        if isinstance(idx, slice):
+            return pd.RangeIndex(idx.start, idx.stop)
+        return pd.Index(idx)
+
+    # Group keys: each key column contributes its level code, with one extra
+    # slot after the last level for missing values, combined mixed-radix.
+    # Key order is therefore pandas' sorted group order, missing last.
+    def levels(self, col):
+        # Sorted distinct non-missing values; a value's code is its position
+        if col not in self.level_cache:
+            if self.is_category(col):
+                levels = np.asarray(self.meta[col]['categories'], dtype=object)
+            else:
+                levels = np.empty(0, dtype=self.arrays[col].dtype)
+                for idx in self.spans():
+                    part = self.raw(col, idx)
+                    levels = np.union1d(levels, part[~pd.isna(part)])
+            self.level_cache[col] = levels
+        return self.level_cache[col]
+
+    def codes(self, col, idx):
+        raw = self.raw(col, idx)
+        if self.is_category(col):
+            return raw.astype(np.int64)
+        codes = np.searchsorted(self.levels(col), raw)
+        return np.where(pd.isna(raw), -1, codes)
+
+    def radices(self, by):
+        return [len(self.levels(col)) + 1 for col in by]
+
+    def group_keys(self, by, idx, radices):
+        n = idx.stop - idx.start if isinstance(idx, slice) else len(idx)
+        keys = np.zeros(n, dtype=np.int64)
+        for col, radix in zip(by, radices):
+            codes = self.codes(col, idx)
+            keys = keys * radix + np.where(codes < 0, radix - 1, codes)
+        return keys
+
+    def split_keys(self, keys, radices):
+        codes = []
+        keys = np.asarray(keys, dtype=np.int64)
+        for radix in reversed(radices):
+            codes.append(keys % radix)
+            keys = keys // radix
+        return codes[::-1]
+
+    def decode(self, by, keys, radices):
+        # Inverse of group_keys: one column of values per key column
+        out = pd.DataFrame(index=pd.RangeIndex(len(keys)))
+        for col, radix, codes in zip(by, radices, self.split_keys(keys, radices)):
+            missing = codes == radix - 1
+            if self.is_category(col):
+                out[col] = pd.Categorical.from_codes(np.where(missing, -1, codes), categories=self.meta[col]['categories'])
+            else:
+                levels = self.levels(col)
+                values = levels[np.where(missing, 0, codes)] if len(levels) else np.zeros(len(codes))
+                out[col] = pd.Series(values).mask(missing)
+        return out
+
+    def group_stats(self, by, measures, rows=None, dropna=True):
+        # Chunked equivalent of grouping by `by` and taking the sum, count and
+        # sum of squares of every measure: one bincount per statistic per chunk
+        for m in measures:
+            if self.is_category(m):
+                raise ValueError(f'{m} is not numeric')
+        radices = self.radices(by)
+        n_keys = prod(radices)
+        if n_keys >= 2 ** 63:
+            raise ValueError(f'Too many combinations of {by} to group by')
+        names = [f'{m}_{stat}' for m in measures for stat in ('sum', 'count', 'sumsq')] + ['n_rows']
+
+        dense = np.zeros((len(names), n_keys)) if n_keys <= DENSE_KEYS else None
+        parts = []
+        for idx in self.spans(rows):
+            keys = self.group_keys(by, idx, radices)
+            if dense is None:
+                uniques, keys = np.unique(keys, return_inverse=True)
+                size = len(uniques)
+            else:
+                size = n_keys
+
+            stats = []
+            for m in measures:
+                values = self.raw(m, idx).astype(np.float64)
+                valid = ~np.isnan(values)
+                filled = np.where(valid, values, 0.0)
+                stats.append(np.bincount(keys, filled, size))
+                stats.append(np.bincount(keys, valid.astype(np.float64), size))
+                stats.append(np.bincount(keys, filled * filled, size))
+            stats.append(np.bincount(keys, minlength=size).astype(np.float64))
+
+            if dense is None:
+                parts.append(pd.DataFrame(np.column_stack(stats), index=uniques, columns=names))
+            else:
+                dense += np.vstack(stats)
+
+        if dense is None:
+            table = pd.concat(parts).groupby(level=0).sum() if parts else pd.DataFrame(columns=names)
+            keys, values = table.index.to_numpy(dtype=np.int64), table.to_numpy().T
+        else:
+            keys = np.flatnonzero(dense[-1])
+            values = dense[:, keys]
+
+        out = self.decode(by, keys, radices)
+        for name, column in zip(names, values):
+            out[name] = column.astype(np.int64) if name.endswith('_count') or name == 'n_rows' else column
+        if dropna:
+            present = np.ones(len(keys), dtype=bool)
+            for radix, codes in zip(radices, self.split_keys(keys, radices)):
+                present &= codes != radix - 1
+            out = out[present].reset_index(drop=True)
+        return out
+
+
+# -----------------------
+# Filtered view
+# -----------------------
+class View:
+    # A row selection over a ColumnStore that stands in for a (filtered)
+    # DataFrame. Indexing it materialises only the requested columns of the
+    # selected rows; aggregates go through the functions below, which pick
+    # pandas or the chunked kernels depending on the size of the projection.
+
+    def __init__(self, store, rows=None):
+        self.store = store
+        self.rows = rows
+        self.columns = store.empty.columns
+        self.dtypes = store.empty.dtypes
+
+    def __len__(self):
+        return self.store.n_rows if self.rows is None else len(self.rows)
+
+    @property
+    def index(self):
+        # Row labels of the full frame, like DataFrame.take keeps them
+        return pd.RangeIndex(self.store.n_rows) if self.rows is None else pd.Index(self.rows)
+
+    def select_dtypes(self, include=None, exclude=None):
+        return self.store.empty.select_dtypes(include=include, exclude=exclude)
+
+    def take(self, positions):
+        positions = np.asarray(positions)
+        return View(self.store, positions if self.rows is None else self.rows[positions])
+
+    def project(self, columns):
+        index = None if self.rows is None else pd.Index(self.rows)
+        return self.store.frame(list(dict.fromkeys(columns)), self.rows, index=index)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.project([key])[key]
+        return self.project(key)
+
+    def chunks(self, columns=None):
+        columns = list(self.columns) if columns is None else columns
+        for idx in self.store.spans(self.rows):
+            yield self.store.frame(columns, idx, index=self.store.span_index(idx))
+
+    def fits(self, columns):
+        # Budgeted as float64 working copies of every projected column
+        return len(self) * 8 * len(set(columns)) <= MEMORY_BUDGET
+
+
+def in_memory(df, columns):
+    # The frame pandas should work on, or None when the kernels have to
+    if not isinstance(df, View):
+        return df
+    if df.fits(columns):
+        return df.project(columns)
+    return None
+
+
+def chunks(df, columns):
+    # The columns chunk by chunk on a View, or all at once on a DataFrame
+    if isinstance(df, View):
+        yield from df.chunks(columns)
+    else:
+        yield df[columns]
+
+
+# -----------------------
+# Aggregates (DataFrame or View)
+# -----------------------
+def group_stats(df, by, measures, dropna=True):
+    # Sum / count / sum of squares of each measure per group of `by`, as a
+    # flat frame: the by columns, then <m>_sum, <m>_count, <m>_sumsq, n_rows
+    with tracing.span('group_stats', 'aggregate', rows=len(df), by=by) as sp:
+        frame = in_memory(df, by + measures)
+        if frame is None:
+            sp.set(path='chunked')
+            return df.store.group_stats(by, measures, df.rows, dropna)
+
+        values = {}
+        for m in measures:
+            col = frame[m].astype('float64')
+            values[f'{m}_sum'] = col
+            values[f'{m}_count'] = col.notna().astype('int64')
+            values[f'{m}_sumsq'] = col * col
+        values['n_rows'] = np.ones(len(frame), dtype='int64')
+
+        table = pd.DataFrame(values, index=frame.index)
+        keys = [frame[d] for d in by]
+        return table.groupby(keys, observed=True, dropna=dropna).sum(min_count=0).reset_index()
+
+
+def groupby_mean(df, by, col):
+    # df.groupby(by, observed=True)[col].mean().reset_index()
+    frame = in_memory(df, [by, col])
+    if frame is not None:
+        return frame.groupby(by, observed=True)[col].mean().reset_index()
+    stats = group_stats(df, [by], [col])
+    stats[col] = (stats[f'{col}_sum'] / stats[f'{col}_count']).where(stats[f'{col}_count'] > 0)
+    return stats[[by, col]]
+
+
+def value_counts(df, col):
+    # df[col].value_counts(): most frequent first, ties in sorted value order
+    frame = in_memory(df, [col])
+    if frame is not None:
+        return frame[col].value_counts()
+    stats = group_stats(df, [col], [])
+    counts = pd.Series(stats['n_rows'].to_numpy(), index=pd.Index(stats[col], name=col), name='count')
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+def nunique(df, col):
+    frame = in_memory(df, [col])
+    if frame is not None:
+        return frame[col].nunique()
+    return len(group_stats(df, [col], []))
+
+
+def mode(df, col):
+    # First value of df[col].mode(), or None when there is none
+    frame = in_memory(df, [col])
+    if frame is not None:
+        modes = frame[col].mode()
+        return modes[0] if len(modes) else None
+    counts = value_counts(df, col)
+    return counts.index[0] if len(counts) else None
+
+
+def mean(df, col):
+    frame = in_memory(df, [col])
+    if frame is not None:
+        return frame[col].mean()
+    total = count = 0
+    for idx in df.store.spans(df.rows):
+        values = df.store.raw(col, idx).astype(np.float64)
+        valid = ~np.isnan(values)
+        total += values[valid].sum()
+        count += valid.sum()
+    return total / count if count else np.nan
+
+
+def value_range(df, col):
+    # (min, max) of a numeric column, skipping missing values
+    frame = in_memory(df, [col])
+    if frame is not None:
+        return frame[col].min(), frame[col].max()
+    lo = hi = np.nan
+    for idx in df.store.spans(df.rows):
+        values = df.store.raw(col, idx).astype(np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            lo, hi = np.fmin(lo, values.min()), np.fmax(hi, values.max())
+    return lo, hi
+
+
+def histogram_source(df, cols):
+    # Data for px.histogram(x=cols[0], color=cols[1], y=<y>): the rows
+    # themselves when they fit (y=None counts them), else one row per
+    # combination with its count in n_rows (y='n_rows' sums the counts)
+    cols = list(dict.fromkeys(cols))
+    frame = in_memory(df, cols)
+    if frame is not None:
+        return frame, None
+    return group_stats(df, cols, []), 'n_rows'
+
+
+def profile(df):
+    # profiler.profile_frame of every column; profiles chunk by chunk with
+    # histogram edges fixed up front when the view does not fit
+    with tracing.span('profile', 'aggregate', rows=len(df)) as sp:
+        frame = in_memory(df, list(df.columns))
+        if frame is not None:
+            return profiler.profile_frame(frame)
+        sp.set(path='chunked')
+        empty = df.store.empty
+        numeric = [col for col in empty.columns if profiler.column_kind(empty[col]) == 'numeric']
+        ranges = {col: value_range(df, col) for col in numeric}
+        return profiler.profile_chunks(df.chunks(), ranges)
@@ -0,0 +1,218 @@
+import argparse
+import html
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+import charts
+import cube
+import data_store
+import filter_index
+import query
+import scatter
+import sketch
+
+
+OUT_DIR = 'reports'
+
+# One report per value of each group: borough, room type, borough x room type
+GROUPS = [['neighbourhood_group'], ['room_type'], ['neighbourhood_group', 'room_type']]
+
+# How reports get plotly.js: 'inline' embeds it in every file (self-contained),
+# 'directory' writes plotly.min.js once next to them, 'cdn' links to it
+PLOTLYJS = ['inline', 'directory', 'cdn']
+
+FIGURE_HEIGHT = 480
+
+
+# -----------------------
+# Filter combinations
+# -----------------------
+def parse_group(spec):
+    # 'neighbourhood_group,room_type' -> ['neighbourhood_group', 'room_type']; 'all' -> []
+    return [] if spec == 'all' else [col.strip() for col in spec.split(',') if col.strip()]
+
+
+def combinations(filter_idx, groups):
+    # (name, selections) per combination of the groups' values, in sidebar
+    # option order. Missing values get no report of their own.
+    out = []
+    for group in groups:
+        unknown = [col for col in group if col not in filter_idx.options]
+        if unknown:
+            raise ValueError(f"Not filter columns: {', '.join(unknown)} (choose from {', '.join(filter_idx.options)})")
+        values = [[v for v in filter_idx.options[col] if not pd.isna(v)] for col in group]
+        for combo in product(*values):
+            selections = {col: [value] for col, value in zip(group, combo)}
+            name = ' × '.join(str(value) for value in combo) or 'All listings'
+            out.append((name, selections))
+    return out
+
+
+def slug(selections):
+    text = '__'.join(f'{col}-{values[0]}' for col, values in selections.items()) or 'all'
+    return re.sub(r'[^A-Za-z0-9_]+', '-', text).strip('-').lower()
+
+
+# -----------------------
+# Workers
+# -----------------------
+# Set once per worker process: the column store is re-opened (memory-mapped,
+# so every worker shares the page cache) and the aggregates arrive pickled
+# from the parent, which built them once for all combinations.
+_shared = {}
+
+
+def init_worker(cache_dir, filter_idx, olap, sketches, settings):
+    _shared['df'] = query.View(query.ColumnStore(cache_dir))
+    _shared['filter_idx'] = filter_idx
+    _shared['cube'] = olap
+    _shared['sketches'] = sketches
+    _shared['settings'] = settings
+
+
+def build_report(name, selections, path):
+    # Builds every Analysis Question for one combination, as the app's
+    # "All questions" view would, and writes them to one HTML file
+    start = time.perf_counter()
+    settings = _shared['settings']
+    df_filtered = filter_index.apply_rows(_shared['df'], _shared['filter_idx'].select(selections))
+    if len(df_filtered) == 0:
+        return name, None, 0, time.perf_counter() - start
+
+    def scatter_figure(x_col, y_col, title=None, labels=None):
+        reduced = scatter.reduce(df_filtered, x_col, y_col, settings['scatter_limit'], settings['scatter_mode'])
+        return scatter.figure(df_filtered, x_col, y_col, reduced, title=title, labels=labels)
+
+    ctx = {
+        'df': df_filtered,
+        'cube': _shared['cube'],
+        'selections': selections,
+        'scatter_figure': scatter_figure,
+        'sketches': _shared['sketches'],
+        'stat': settings['stat'],
+    }
+    sections = []
+    for qid, q in charts.QUESTIONS.items():
+        if not all(col in df_filtered.columns for col in q['requires']):
+            continue
+        sections.append((q['heading'], charts.build_question(qid, ctx)))
+
+    subtitle = f"{len(df_filtered):,} listings · {charts.STAT_LABELS[settings['stat']]} values"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render(name, subtitle, sections, settings['plotlyjs']))
+    return name, path, len(df_filtered), time.perf_counter() - start
+
+
+# -----------------------
+# HTML
+# -----------------------
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1200px; margin: 2em auto; padding: 0 1em; color: #262730; }}
+h4 {{ margin-top: 2.5em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ padding: 0.3em 1em; border-bottom: 1px solid #ddd; text-align: left; }}
+</style>
+</head>
+<body>
+<h1>🏠 Airbnb Analysis — {title}</h1>
+<p>{subtitle}</p>
+{body}
+</body>
+</html>
+"""
+
+
+def render(title, subtitle, sections, plotlyjs='inline'):
+    # sections: (heading, items) with items as charts.build_question returns
+    # them; plotly.js is included with the first figure only
+    include = {'inline': True, 'directory': 'directory', 'cdn': 'cdn'}[plotlyjs]
+    parts = []
+    for heading, items in sections:
+        parts.append(f'<h4>{html.escape(heading)}</h4>')
+        for item in items:
+            if isinstance(item, str):
+                parts.append(f'<p>{html.escape(item.strip())}</p>')
+            else:
+                parts.append(item.to_html(full_html=False, include_plotlyjs=include, default_height=FIGURE_HEIGHT))
+                include = False
+    return PAGE.format(title=html.escape(title), subtitle=html.escape(subtitle), body='\n'.join(parts))
+
+
+def render_index(results, settings):
+    rows = [
+        f'<tr><td><a href="{html.escape(os.path.basename(path))}">{html.escape(name)}</a></td><td>{n:,}</td></tr>'
+        if path else f'<tr><td>{html.escape(name)}</td><td>no listings</td></tr>'
+        for name, path, n, _ in results
+    ]
+    body = '<table>\n<tr><th>Report</th><th>Listings</th></tr>\n' + '\n'.join(rows) + '\n</table>'
+    subtitle = f"{sum(1 for r in results if r[1]):,} reports · {charts.STAT_LABELS[settings['stat']]} values"
+    return PAGE.format(title='Reports', subtitle=html.escape(subtitle), body=body)
+
+
+# -----------------------
+# Driver
+# -----------------------
+def run(csv_path=data_store.CSV_PATH, out_dir=OUT_DIR, groups=GROUPS, stat='mean', workers=None,
+        scatter_limit=scatter.POINT_LIMIT, scatter_mode='Density', plotlyjs='inline'):
+    # The filter index, cube and sketches are built once here; the pool
+    # then builds figures and writes one report per combination.
+    cache_dir = data_store.ensure_cache(csv_path)
+    df = query.View(query.ColumnStore(cache_dir))
+    filter_idx = filter_index.FilterIndex(df)
+    olap = cube.Cube(df)
+    sketches = sketch.CellSketches(df)
+    settings = {'stat': stat, 'scatter_limit': scatter_limit, 'scatter_mode': scatter_mode, 'plotlyjs': plotlyjs}
+
+    os.makedirs(out_dir, exist_ok=True)
+    if plotlyjs == 'directory':
+        with open(os.path.join(out_dir, 'plotly.min.js'), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    combos = combinations(filter_idx, groups)
+    names = [name for name, _ in combos]
+    selections = [s for _, s in combos]
+    paths = [os.path.join(out_dir, f'{slug(s)}.html') for s in selections]
+    workers = min(workers or os.cpu_count() or 1, max(len(combos), 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache_dir, filter_idx, olap, sketches, settings)) as pool:
+        results = list(pool.map(build_report, names, selections, paths))
+
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(render_index(results, settings))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write an HTML report of every Analysis Question per filter combination, in parallel.')
+    parser.add_argument('csv', nargs='?', default=data_store.CSV_PATH)
+    parser.add_argument('--out', default=OUT_DIR)
+    parser.add_argument('--group', action='append', dest='groups', metavar='COLUMNS',
+                        help="comma-separated filter columns, one report per combination of their values; "
+                             "repeatable, 'all' for the unfiltered data (default: borough, room type, borough,room type)")
+    parser.add_argument('--stat', choices=list(charts.STAT_LABELS), default='mean')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scatter-limit', type=int, default=scatter.POINT_LIMIT)
+    parser.add_argument('--scatter-mode', choices=['Density', 'Sample'], default='Density')
+    parser.add_argument('--plotlyjs', choices=PLOTLYJS, default='inline')
+    args = parser.parse_args()
+
+    groups = [parse_group(spec) for spec in args.groups] if args.groups else GROUPS
+    start = time.perf_counter()
+    try:
+        results = run(args.csv, args.out, groups, args.stat, args.workers, args.scatter_limit, args.scatter_mode, args.plotlyjs)
+    except ValueError as e:
+        parser.error(str(e))
+    written = [r for r in results if r[1]]
+    print(f'Wrote {len(written):,} reports ({len(results) - len(written):,} combinations without listings) '
+          f'to {args.out} in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+
+# Above this many points a scatter is reduced server-side before it is sent
+POINT_LIMIT = 20_000
+
+# Grid used for the density heatmap
+DENSITY_BINS = 200
+
+# Coarser grid used to stratify the sample; sparse cells (outliers) are kept whole
+SAMPLE_BINS = 64
+
+
+def xy_values(frame, x, y):
+    # px.scatter(frame, y=col) without x plots against the index; mirror that
+    xv = frame.index.to_numpy() if x is None else frame[x].to_numpy(dtype='float64', na_value=np.nan)
+    yv = frame[y].to_numpy(dtype='float64', na_value=np.nan)
+    xv = np.asarray(xv, dtype='float64')
+    keep = np.isfinite(xv) & np.isfinite(yv)
+    return xv[keep], yv[keep]
+
+
+def bin_ids(values, bins):
+    lo, hi = values.min(), values.max()
+    if hi == lo:
+        return np.zeros(len(values), dtype=np.int64)
+    ids = ((values - lo) / (hi - lo) * bins).astype(np.int64)
+    return np.clip(ids, 0, bins - 1)
+
+
+def water_level(counts, budget):
+    # Largest per-cell cap c with sum(min(counts, c)) <= budget
+    lo, hi = 1, int(counts.max())
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if np.minimum(counts, mid).sum() <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def stratified_sample(xv, yv, max_points, bins=SAMPLE_BINS, seed=0):
+    # Random sample capped per grid cell: dense regions are thinned, while
+    # points in sparse cells (the outliers) all survive
+    n = len(xv)
+    if n <= max_points:
+        return np.arange(n)
+
+    # Never more cells than the budget can give one point each
+    bins = min(bins, max(1, int(np.sqrt(max_points))))
+    cell = bin_ids(xv, bins) * bins + bin_ids(yv, bins)
+    order = np.random.default_rng(seed).permutation(n)
+    order = order[np.argsort(cell[order], kind='stable')]
+
+    sorted_cells = cell[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_cells)) + 1]
+    counts = np.diff(np.r_[starts, n])
+    rank = np.arange(n) - np.repeat(starts, counts)
+
+    cap = water_level(counts, max_points)
+    keep = order[rank < cap]
+
+    # Spend what is left of the budget on one more point from some of the capped cells
+    spare = max_points - len(keep)
+    if spare > 0:
+        extra = order[rank == cap]
+        keep = np.concatenate([keep, np.random.default_rng(seed).permutation(extra)[:spare]])
+    return np.sort(keep)
+
+
+def density_grid(xv, yv, bins=DENSITY_BINS):
+    counts, x_edges, y_edges = np.histogram2d(xv, yv, bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    # Empty cells stay transparent
+    z = np.where(counts.T > 0, counts.T, np.nan)
+    return x_centers, y_centers, z
+
+
+def reduce(frame, x, y, max_points=POINT_LIMIT, mode='Density'):
+    # Returns None when the frame is small enough to plot as-is
+    if len(frame) <= max_points:
+        return None
+
+    xv, yv = xy_values(frame, x, y)
+    if len(xv) <= max_points:
+        return None
+    if mode == 'Density':
+        x_centers, y_centers, z = density_grid(xv, yv)
+        return {'mode': mode, 'total': len(xv), 'x': x_centers, 'y': y_centers, 'z': z}
+
+    keep = stratified_sample(xv, yv, max_points)
+    return {'mode': mode, 'total': len(xv), 'x': xv[keep], 'y': yv[keep]}
+
+
+def figure(frame, x, y, reduced=None, title=None, labels=None):
+    if reduced is None:
+        # Only the plotted columns are read
+        return px.scatter(frame[[col for col in (x, y) if col]], x=x, y=y, title=title, labels=labels)
+
+    labels = dict(labels or {})
+    x_name = x or 'index'
+    total = reduced['total']
+
+    if reduced['mode'] == 'Density':
+        fig = px.imshow(
+            reduced['z'],
+            x=reduced['x'],
+            y=reduced['y'],
+            origin='lower',
+            aspect='auto',
+            color_continuous_scale='Viridis',
+            labels={'x': labels.get(x_name, x_name), 'y': labels.get(y, y), 'color': 'Listings'},
+            title=f"{title} (density of {total:,} points)",
+        )
+        return fig
+
+    points = pd.DataFrame({x_name: reduced['x'], y: reduced['y']})
+    return px.scatter(
+        points,
+        x=x_name,
+        y=y,
+        labels=labels,
+        title=f"{title} ({len(points):,} of {total:,} points, stratified sample)",
+    )
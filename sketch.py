@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+import cube
+import query
+
+
+# Skewed measures that get quantile sketches per cube cell
+MEASURES = ['price', 'service_fee', 'minimum_nights', 'reviews_per_month']
+
+# Percentile statistics the charts can show instead of means, and their quantiles
+QUANTILE_STATS = {'median': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+# t-digest compression: a digest keeps at most COMPRESSION / 2 centroids
+COMPRESSION = 500
+
+# Worst rank error allowed by benchmarks/bench_sketch.py: an estimated
+# quantile q must lie between the exact q - RANK_ERROR and q + RANK_ERROR
+# quantiles of the same rows
+RANK_ERROR = 0.005
+
+
+def k_scale(q, compression=COMPRESSION):
+    # t-digest's k1 scale: a centroid spans at most one unit of k, so
+    # centroids shrink towards both tails and extreme quantiles stay sharp
+    return compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0, 1) - 1)
+
+
+class Digests:
+    # One t-digest per group, for many groups at once, stored flat:
+    # centroids sorted by group then mean, plus every group's exact row
+    # count, minimum and maximum. Merging digests (every cell a filter keeps,
+    # rolled up by some dimensions) re-clusters their centroids, so its cost
+    # depends on the number of centroids, never on the number of rows.
+
+    def __init__(self, groups, means, weights, ids, lo, hi):
+        self.groups = groups
+        self.means = means
+        self.weights = weights
+        self.ids = ids
+        self.lo = lo
+        self.hi = hi
+
+    @classmethod
+    def build(cls, groups, values, compression=COMPRESSION):
+        # Digests of raw values (no missing values) grouped by an integer key
+        return cls.cluster(groups, values, np.ones(len(values)), groups, values, values, compression)
+
+    @classmethod
+    def concat(cls, parts):
+        # Stacked digests, e.g. one per chunk; groups may repeat until merged
+        return cls(*(np.concatenate([getattr(p, name) for p in parts])
+                     for name in ['groups', 'means', 'weights', 'ids', 'lo', 'hi']))
+
+    def merge(self, regroup=None, compression=COMPRESSION):
+        # One digest per distinct new group. regroup maps old group ids to new
+        # ones (an array indexed by id; negative drops the group), or None to
+        # merge repeated groups.
+        groups, ids = self.groups, self.ids
+        means, weights, lo, hi = self.means, self.weights, self.lo, self.hi
+        if regroup is not None:
+            groups, ids = regroup[groups], regroup[ids]
+            keep, keep_ids = groups >= 0, ids >= 0
+            groups, means, weights = groups[keep], means[keep], weights[keep]
+            ids, lo, hi = ids[keep_ids], lo[keep_ids], hi[keep_ids]
+        return self.cluster(groups, means, weights, ids, lo, hi, compression)
+
+    @classmethod
+    def cluster(cls, groups, means, weights, ids, lo, hi, compression=COMPRESSION):
+        # Sorts the centroids within each group and merges neighbours whose
+        # midpoint falls in the same unit of k
+        order = np.lexsort((means, groups))
+        groups, means, weights = groups[order], means[order], weights[order]
+        if len(groups) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, np.empty(0), np.empty(0), empty, np.empty(0), np.empty(0))
+
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        counts = np.diff(np.r_[starts, len(groups)])
+        before = np.cumsum(weights) - weights
+        within = before - np.repeat(before[starts], counts)
+        totals = np.repeat(np.add.reduceat(weights, starts), counts)
+        k = k_scale((within + weights / 2) / totals, compression)
+        slot = np.floor(k - k_scale(0.0, compression)).astype(np.int64)
+
+        # Consecutive entries with the same (group, slot) become one centroid
+        stride = compression // 2 + 2
+        key = np.repeat(np.arange(len(starts)), counts) * stride + slot
+        new = np.r_[True, key[1:] != key[:-1]]
+        first = np.flatnonzero(new)
+        merged_weights = np.add.reduceat(weights, first)
+        merged_means = np.add.reduceat(weights * means, first) / merged_weights
+        # A cluster of one repeated value keeps it exactly, not a rounded average
+        smallest = np.minimum.reduceat(means, first)
+        merged_means = np.where(smallest == np.maximum.reduceat(means, first), smallest, merged_means)
+
+        ids, lo, hi = extremes(ids, lo, hi)
+        return cls(groups[first], merged_means, merged_weights, ids, lo, hi)
+
+    def totals(self):
+        # Exact row count and mean per group: merging never changes a
+        # group's total weight or weighted sum
+        position = np.searchsorted(self.ids, self.groups)
+        count = np.bincount(position, weights=self.weights, minlength=len(self.ids))
+        sums = np.bincount(position, weights=self.weights * self.means, minlength=len(self.ids))
+        return count, np.where(count > 0, sums / np.maximum(count, 1), np.nan)
+
+    def quantiles(self, qs):
+        # (groups x qs) estimates. Groups whose digest still holds every row
+        # are exact, as np.quantile; otherwise interpolated between centroid
+        # midpoints and pinned to the group's exact minimum and maximum. A run
+        # of centroids with the same mean can only hold one repeated value
+        # (ties are common: prices and night counts are integers), so it is
+        # flat from its first row to its last instead of interpolated.
+        qs = np.asarray(qs, dtype='float64')
+        out = np.full((len(self.ids), len(qs)), np.nan)
+        bounds = np.searchsorted(self.groups, np.r_[self.ids, np.iinfo(np.int64).max])
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            means, weights = self.means[start:end], self.weights[start:end]
+            if len(means) == 0:
+                continue
+            if (weights == 1).all():
+                out[i] = np.quantile(means, qs)
+                continue
+            cum = np.cumsum(weights)
+            xp, fp = cum - weights / 2, means
+            tied = np.r_[means[1:] == means[:-1], False] | np.r_[False, means[1:] == means[:-1]]
+            if tied.any():
+                run_start = tied & np.r_[True, means[1:] != means[:-1]]
+                run_end = tied & np.r_[means[1:] != means[:-1], True]
+                xp = np.where(run_start, cum - weights, np.where(run_end, cum, xp))
+                keep = ~tied | run_start | run_end
+                xp, fp = xp[keep], fp[keep]
+            total = cum[-1]
+            out[i] = np.interp(qs * total, np.r_[0.0, xp, total], np.r_[self.lo[i], fp, self.hi[i]])
+        return out
+
+
+def extremes(ids, lo, hi):
+    # Distinct ids with the smallest lo and largest hi of each
+    if len(ids) == 0:
+        return ids, lo, hi
+    order = np.argsort(ids, kind='stable')
+    ids, lo, hi = ids[order], lo[order], hi[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return ids[starts], np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)
+
+
+class CellSketches:
+    # A t-digest of each measure per cell of the cube's dimensions, built
+    # once at load time (chunk by chunk when the data does not fit). Quantiles
+    # under any filter on the dimensions, grouped by any subset of them, come
+    # from merging the digests of the matching cells.
+
+    def __init__(self, df, dimensions=cube.DIMENSIONS, measures=MEASURES, compression=COMPRESSION):
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        self.measures = [m for m in measures if m in df.columns]
+        self.compression = compression
+
+        values = cube.dimension_values(df, self.dimensions)
+        parts = {m: [] for m in self.measures}
+        for frame in query.chunks(df, self.dimensions + self.measures):
+            codes = cube.combination_codes(frame, values)
+            for m in self.measures:
+                x = frame[m].to_numpy(dtype='float64', na_value=np.nan)
+                present = ~np.isnan(x)
+                parts[m].append(Digests.build(codes[present], x[present], compression))
+        digests = {m: Digests.concat(parts[m]).merge(compression=compression) for m in self.measures}
+
+        # Cells are the combinations seen in any measure, renumbered 0..n-1
+        seen = np.unique(np.concatenate([d.ids for d in digests.values()] + [np.empty(0, dtype=np.int64)]))
+        self.cells = cube.combinations(values, seen)
+        renumber = np.full(int(seen.max()) + 1 if len(seen) else 0, -1, dtype=np.int64)
+        renumber[seen] = np.arange(len(seen))
+        self.digests = {m: d.merge(renumber, compression) for m, d in digests.items()}
+
+    def rollup(self, by, measure, qs, selections=None, exclude=None):
+        # Row count, mean and one column of estimates per q of the measure,
+        # for the rows the filter keeps, grouped by `by` like
+        # groupby(by, sort=True)
+        if isinstance(by, str):
+            by = [by]
+        mask = cube.cell_mask(self.cells, selections, exclude)
+        grouped = self.cells[mask].groupby(by, sort=True)
+        regroup = np.full(len(self.cells), -1, dtype=np.int64)
+        # Cells with a missing `by` value belong to no group, as in pandas
+        regroup[mask] = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        return self.summarise(measure, qs, regroup, grouped.size().index)
+
+    def total(self, measure, qs, selections=None, exclude=None):
+        # Same as rollup for all the rows the filter keeps, as one row
+        regroup = np.where(cube.cell_mask(self.cells, selections, exclude), 0, -1)
+        return self.summarise(measure, qs, regroup, pd.RangeIndex(1)).iloc[0]
+
+    def summarise(self, measure, qs, regroup, index):
+        merged = self.digests[measure].merge(regroup, self.compression)
+        out = pd.DataFrame(np.nan, index=index, columns=['count', 'mean'] + list(qs))
+        if len(merged.ids):
+            count, mean = merged.totals()
+            out.iloc[merged.ids, 0] = count
+            out.iloc[merged.ids, 1] = mean
+            out.iloc[merged.ids, 2:] = merged.quantiles(qs)
+        out['count'] = out['count'].fillna(0).astype('int64')
+        return out
@@ -0,0 +1,227 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+
+
+# Named dataset sizes for the benchmarks
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+CHUNK_ROWS = 250_000
+SEED = 0
+
+# Share of listings per borough / room type / policy, roughly as in the NYC open data
+BOROUGHS = {
+    'Manhattan': 0.425,
+    'Brooklyn': 0.410,
+    'Queens': 0.130,
+    'Bronx': 0.027,
+    'Staten Island': 0.008,
+}
+ROOM_TYPES = {
+    'Entire home/apt': 0.525,
+    'Private room': 0.452,
+    'Shared room': 0.022,
+    'Hotel room': 0.001,
+}
+CANCELLATION_POLICIES = {'moderate': 0.334, 'strict': 0.333, 'flexible': 0.333}
+IDENTITY = {'unconfirmed': 0.5, 'verified': 0.5}
+
+# Neighbourhoods per borough (224 in all, as in the source data); listings
+# are spread over them with a Zipf-like skew
+NEIGHBOURHOODS = {'Manhattan': 32, 'Brooklyn': 48, 'Queens': 51, 'Bronx': 48, 'Staten Island': 45}
+NEIGHBOURHOOD_SKEW = 1.1
+
+# Rough borough centres and spread, in degrees
+BOROUGH_CENTRES = {
+    'Manhattan': (40.78, -73.97, 0.035),
+    'Brooklyn': (40.66, -73.95, 0.045),
+    'Queens': (40.72, -73.84, 0.06),
+    'Bronx': (40.85, -73.88, 0.035),
+    'Staten Island': (40.58, -74.13, 0.04),
+}
+
+# Listing names come from a fixed vocabulary (about two thousand distinct
+# titles); host names from a Zipf-skewed pool
+NAME_ADJECTIVES = ['Cozy', 'Sunny', 'Spacious', 'Charming', 'Modern', 'Quiet', 'Bright', 'Luxury',
+                   'Renovated', 'Stylish', 'Huge', 'Private', 'Classic', 'Lovely', 'Budget', 'Chic']
+NAME_NOUNS = ['Studio', 'Loft', 'Room', 'Apartment', 'Suite', 'Townhouse', 'Duplex', 'Penthouse',
+              'Bedroom', 'Flat', 'Brownstone', 'Garden Unit']
+NAME_PLACES = ['near Park', 'by Subway', 'with View', 'in Heart of City', 'near Downtown',
+               'close to Airport', 'on Quiet Street', 'with Rooftop', 'near Museums', 'by the River']
+HOST_NAMES = 5_000
+
+# Share of missing values per column, as left by the cleaning pipeline
+MISSING = {
+    'name': 0.0025,
+    'host_identity_verified': 0.003,
+    'host_name': 0.004,
+    'instant_bookable': 0.001,
+    'cancellation_policy': 0.0008,
+    'construction_year': 0.002,
+    'service_fee': 0.003,
+    'review_rate_number': 0.003,
+    'calculated_host_listings_count': 0.003,
+}
+
+FIRST_REVIEW = pd.Timestamp('2012-07-01')
+LAST_REVIEW = pd.Timestamp('2022-05-31')
+
+
+# -----------------------
+# Generation
+# -----------------------
+def choice(rng, weights, n):
+    values = list(weights)
+    p = np.array(list(weights.values()), dtype='float64')
+    return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=p / p.sum())]
+
+
+def neighbourhoods(rng, boroughs):
+    out = np.empty(len(boroughs), dtype=object)
+    for borough, count in NEIGHBOURHOODS.items():
+        rows = np.flatnonzero(boroughs == borough)
+        ranks = np.arange(1, count + 1)
+        p = ranks ** -NEIGHBOURHOOD_SKEW
+        picks = rng.choice(count, size=len(rows), p=p / p.sum())
+        out[rows] = np.char.add(f'{borough} ', (picks + 1).astype(str)).astype(object)
+    return out
+
+
+def coordinates(rng, boroughs):
+    lat = np.empty(len(boroughs))
+    lon = np.empty(len(boroughs))
+    for borough, (centre_lat, centre_lon, spread) in BOROUGH_CENTRES.items():
+        rows = np.flatnonzero(boroughs == borough)
+        lat[rows] = rng.normal(centre_lat, spread, len(rows))
+        lon[rows] = rng.normal(centre_lon, spread, len(rows))
+    return lat.round(5), lon.round(5)
+
+
+def listing_names(rng, n):
+    adjectives = np.array(NAME_ADJECTIVES, dtype=object)[rng.integers(len(NAME_ADJECTIVES), size=n)]
+    nouns = np.array(NAME_NOUNS, dtype=object)[rng.integers(len(NAME_NOUNS), size=n)]
+    places = np.array(NAME_PLACES, dtype=object)[rng.integers(len(NAME_PLACES), size=n)]
+    return adjectives + ' ' + nouns + ' ' + places
+
+
+def review_dates(rng, n):
+    # Skewed towards recent years, like the source data
+    span = (LAST_REVIEW - FIRST_REVIEW).days
+    days = (rng.beta(5, 1.6, n) * span).astype('int64')
+    return (FIRST_REVIEW + pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d')
+
+
+def generate_chunk(rng, start, n):
+    # One chunk of listings in the raw column layout the cleaning stages expect
+    boroughs = choice(rng, BOROUGHS, n)
+    lat, lon = coordinates(rng, boroughs)
+
+    price = rng.integers(50, 1201, n).astype('float64')
+    # Mostly 20% of the price; some hosts charge a flat fee instead
+    flat_fee = rng.random(n) < 0.1
+    service_fee = np.where(flat_fee, rng.integers(10, 241, n), np.round(price * 0.2))
+
+    # Heavy-tailed host sizes: most hosts have one listing, a few have hundreds
+    host_listings = np.minimum(rng.zipf(2.2, n), 350).astype('float64')
+    # Short stays dominate; a tail of monthly and longer minimums
+    minimum_nights = np.where(rng.random(n) < 0.8, rng.integers(1, 8, n), rng.integers(1, 366, n))
+
+    n_reviews = np.minimum(rng.negative_binomial(0.45, 0.015, n), 1000)
+    reviews_per_month = np.round(rng.gamma(1.1, 1.3, n), 2)
+    dates = np.where(n_reviews > 0, review_dates(rng, n), None)
+
+    availability = np.where(rng.random(n) < 0.25, 0, rng.integers(0, 366, n))
+
+    df = pd.DataFrame({
+        'id': np.arange(start, start + n, dtype='int64') + 1_000_000,
+        'name': listing_names(rng, n),
+        'host_id': rng.integers(10 ** 9, 10 ** 11, n),
+        'host_identity_verified': choice(rng, IDENTITY, n),
+        'host_name': np.char.add('Host ', ((rng.zipf(1.3, n) - 1) % HOST_NAMES + 1).astype(str)).astype(object),
+        'neighbourhood_group': boroughs,
+        'neighbourhood': neighbourhoods(rng, boroughs),
+        'latitude': lat,
+        'longitude': lon,
+        'instant_bookable': rng.random(n) < 0.5,
+        'cancellation_policy': choice(rng, CANCELLATION_POLICIES, n),
+        'room_type': choice(rng, ROOM_TYPES, n),
+        'construction_year': rng.integers(2003, 2023, n).astype('float64'),
+        'price': price,
+        'service_fee': service_fee,
+        'minimum_nights': minimum_nights,
+        'number_of_reviews': n_reviews,
+        'last_review_date': dates,
+        'reviews_per_month': reviews_per_month,
+        'review_rate_number': rng.integers(1, 6, n).astype('float64'),
+        'calculated_host_listings_count': host_listings,
+        'availability_365': availability,
+    })
+    df['instant_bookable'] = df['instant_bookable'].astype(object)
+
+    for col, share in MISSING.items():
+        df.loc[rng.random(n) < share, col] = None
+    return df
+
+
+def synthesize_chunk(seed, start, n):
+    # Same derived columns as the real pipeline: the cleaning stages that
+    # impute reviews and add the year and bins run on the synthetic rows
+    rng = np.random.default_rng([seed, start])
+    df = generate_chunk(rng, start, n)
+    for stage in [cleaning.impute_reviews, cleaning.add_year, cleaning.add_bins]:
+        df = stage(df)
+    return df.reindex(columns=cleaning.OUTPUT_COLUMNS)
+
+
+def chunks(n_rows, seed=SEED, chunk_rows=CHUNK_ROWS):
+    # Each chunk is seeded by its first row, so output is reproducible
+    for start in range(0, n_rows, chunk_rows):
+        yield synthesize_chunk(seed, start, min(chunk_rows, n_rows - start))
+
+
+def write_csv(path, n_rows, seed=SEED, chunk_rows=CHUNK_ROWS):
+    # Written chunk by chunk, so 10M rows never sit in memory at once
+    out_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.synthetic-', suffix='.csv', dir=out_dir)
+    os.close(fd)
+    try:
+        with open(tmp_path, 'w', newline='') as out:
+            out.write(','.join(cleaning.OUTPUT_COLUMNS) + '\n')
+            for chunk in chunks(n_rows, seed, chunk_rows):
+                out.write(chunk.to_csv(header=False, index=False))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def default_path(size):
+    # Each size lives in its own folder under the app's CSV name, so the app
+    # can be started there unchanged
+    return os.path.join('synthetic', size, cleaning.CLEAN_CSV_PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic Airbnb-shaped dataset in the cleaned CSV layout.')
+    parser.add_argument('size', help=f"one of {', '.join(SIZES)} or a row count")
+    parser.add_argument('--out', default=None, help='defaults to synthetic/<size>/Airbnb_Cleaned.csv')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    n_rows = SIZES[args.size] if args.size in SIZES else int(args.size)
+    out = args.out or default_path(args.size)
+    write_csv(out, n_rows, args.seed, args.chunksize)
+    print(f'Wrote {n_rows:,} rows to {out}')
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import query
+
+
+PAGE_SIZES = [25, 50, 100, 250, 500]
+
+
+class SortIndex:
+    # Ascending sort order per column over the shared frame, built the first
+    # time a column is sorted on and reused by every session after that.
+    # Missing values always go last, like DataFrame.sort_values.
+    #
+    # Per column it keeps the permutation of the rows with a value and each
+    # row's place in it (-1 where missing). On a query.View both are written
+    # next to the column cache (<cache>/sort/) and memory-mapped, so they cost
+    # page cache, not process memory, and survive restarts until the cache is
+    # rebuilt. A selection of k rows is then ordered by reading and sorting k
+    # places, without any full-length mask.
+
+    def __init__(self, df):
+        self.df = df
+        self.perms = {}
+
+    def build(self, col):
+        series = self.df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            key = np.asarray(series.cat.codes)
+        else:
+            key = series.to_numpy()
+        missing = series.isna().to_numpy()
+        del series
+
+        present = np.flatnonzero(~missing)
+        perm = present[np.argsort(key[present], kind='stable')]
+        rank = np.full(len(missing), -1, dtype=np.int64)
+        rank[perm] = np.arange(len(perm))
+        return {'perm': perm, 'rank': rank}
+
+    def permutation(self, col):
+        # (permutation of the rows with a value, place of each row in it)
+        if col not in self.perms:
+            if isinstance(self.df, query.View) and self.df.rows is None:
+                store = self.df.store
+                name = os.path.splitext(store.meta[col]['file'])[0]
+                arrays = store.derived(os.path.join('sort', name), lambda: self.build(col))
+            else:
+                arrays = self.build(col)
+            self.perms[col] = (arrays['perm'], arrays['rank'])
+        return self.perms[col]
+
+    def places(self, col, rows=None):
+        # Place of each row (or of the given rows) in the column's ascending order, -1 where missing
+        rank = self.permutation(col)[1]
+        return np.asarray(rank if rows is None else rank[rows])
+
+    def ordered_rows(self, col, ascending=True, rows=None):
+        # Row positions of the filtered view (rows=None means every row) in
+        # sort order. rows are sorted positions, as FilterIndex.select returns.
+        perm, rank = self.permutation(col)
+        if rows is None:
+            present = np.asarray(perm)
+            missing = np.flatnonzero(np.asarray(rank) < 0)
+        else:
+            places = np.asarray(rank[rows])
+            has_value = places >= 0
+            present = rows[has_value][np.argsort(places[has_value])]
+            missing = rows[~has_value]
+        if not ascending:
+            present = present[::-1]
+        return np.concatenate([present, missing])
+
+
+def page_bounds(total, page, page_size):
+    start = min((page - 1) * page_size, total)
+    return start, min(start + page_size, total)
+
+
+def page_frame(df, positions, start, end, columns):
+    # Only the visible window is materialised; on a query.View, only the projected columns
+    if positions is None:
+        window = np.arange(start, end)
+    else:
+        window = positions[start:end]
+    return df.take(window)[list(columns)]
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+# When set, every rerun of every session is traced and dumped into this folder
+TRACE_DIR_ENV = 'AIRBNB_TRACE_DIR'
+
+# The active trace lives on the script thread, so sessions don't see each other's spans
+_local = threading.local()
+
+# tracemalloc is process-wide: it runs while at least one open trace asks for memory
+_memory_lock = threading.Lock()
+_memory_traces = set()
+
+
+class NullSpan:
+    # What span() hands out when tracing is off: entering, leaving and
+    # annotating it do nothing, so instrumented code costs one attribute lookup
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, rows=None, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    # One named, timed region. Memory is what tracemalloc saw while the span
+    # was open: net allocation and the peak above the starting point.
+
+    def __init__(self, trace, name, cat, rows, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.rows = rows
+        self.args = args
+        self.depth = len(trace.stack)
+        self.start = self.end = None
+        self.child_seconds = 0.0
+        self.alloc = self.peak = None
+        self.mem_start = self.peak_seen = 0
+
+    def set(self, rows=None, **args):
+        if rows is not None:
+            self.rows = rows
+        self.args.update(args)
+
+    def __enter__(self):
+        trace = self.trace
+        if trace.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if trace.stack:
+                # The enclosing span keeps the peak it saw before this one resets it
+                parent = trace.stack[-1]
+                parent.peak_seen = max(parent.peak_seen, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = self.peak_seen = current
+        trace.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.end = time.perf_counter()
+        trace = self.trace
+        trace.stack.pop()
+        if trace.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_seen = max(self.peak_seen, peak)
+            self.alloc = current - self.mem_start
+            self.peak = self.peak_seen - self.mem_start
+        if trace.stack:
+            parent = trace.stack[-1]
+            parent.child_seconds += self.end - self.start
+            parent.peak_seen = max(parent.peak_seen, self.peak_seen)
+        trace.spans.append(self)
+        return False
+
+    @property
+    def seconds(self):
+        return self.end - self.start
+
+
+class Trace:
+    # Spans recorded during one script rerun
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.spans = []
+        self.stack = []
+        self.origin = time.perf_counter()
+        self.wall_start = time.time()
+        self.thread = threading.get_ident()
+
+    def summary(self):
+        # One row per span in start order, indented by nesting depth
+        rows = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            rows.append({
+                'span': '  ' * s.depth + s.name,
+                'ms': s.seconds * 1e3,
+                'self ms': (s.seconds - s.child_seconds) * 1e3,
+                'rows': s.rows,
+                'alloc MB': s.alloc / 1e6 if s.alloc is not None else None,
+                'peak MB': s.peak / 1e6 if s.peak is not None else None,
+            })
+        return rows
+
+    def to_chrome(self):
+        # Chrome trace event format: load in chrome://tracing or ui.perfetto.dev
+        events = []
+        for s in self.spans:
+            args = dict(s.args)
+            if s.rows is not None:
+                args['rows'] = s.rows
+            if s.alloc is not None:
+                args['alloc_bytes'] = s.alloc
+                args['peak_bytes'] = s.peak
+            events.append({
+                'name': s.name,
+                'cat': s.cat,
+                'ph': 'X',
+                'ts': (self.wall_start + s.start - self.origin) * 1e6,
+                'dur': s.seconds * 1e6,
+                'pid': os.getpid(),
+                'tid': self.thread,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_json(self):
+        return json.dumps(self.to_chrome(), default=str)
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'trace-{int(self.wall_start * 1e6)}-{self.thread}.json')
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+        return path
+
+
+def _track_memory(trace, open_):
+    with _memory_lock:
+        if open_:
+            _memory_traces.add(trace)
+        else:
+            _memory_traces.discard(trace)
+        # A rerun stopped part way never finishes its trace; drop it once its thread is gone
+        alive = {thread.ident for thread in threading.enumerate()}
+        _memory_traces.difference_update([t for t in _memory_traces if t.thread not in alive])
+        if _memory_traces and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _memory_traces and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def start(memory=True):
+    # Begins tracing the calling thread's rerun; a trace left open by an
+    # interrupted rerun is discarded
+    finish()
+    trace = _local.trace = Trace(memory)
+    if memory:
+        _track_memory(trace, True)
+    return trace
+
+
+def finish():
+    trace = current()
+    if trace is not None:
+        _local.trace = None
+        if trace.memory:
+            _track_memory(trace, False)
+    return trace
+
+
+def span(name, cat='app', rows=None, **args):
+    # with tracing.span('filter', rows=n) as sp: ...; sp.set(rows=...) once known
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, name, cat, rows, args)